@@ -3,7 +3,7 @@ from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth import login
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
-from store.models import Order
+from store.models import CustomerStats
 
 
 def login_view(request):
@@ -34,8 +34,8 @@ def logout_view(request):
 
 @login_required
 def profile_view(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    stats = CustomerStats.objects.filter(user=request.user).first()
 
     return render(request, 'store/profile.html', {
-        'orders': orders
+        'stats': stats
     })
@@ -42,27 +42,39 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, like UpdateCacheMiddleware: it must see every cookie the
+    # other middleware set before deciding to cache a response.
+    'store.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'salepoint.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.catalog',
+            ],
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
             ],
         },
     },
@@ -82,6 +94,86 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'salepoint',
+    }
+}
+
+# Lifetime of cached template fragments (footer, category strip, product cards).
+# Catalog fragments are also keyed by a version that is bumped on every change.
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# Whole pages served from cache to anonymous visitors without a cart.
+# MAX_AGE is what reverse proxies see in Cache-Control.
+ANONYMOUS_PAGE_CACHE_URLS = [
+    'home',
+    'deals',
+    'categories',
+    'category_detail',
+    'product_detail',
+]
+ANONYMOUS_PAGE_CACHE_MAX_AGE = 60
+
+
+# Request rate limits per URL name as "<count>/<s|m|h|d>" (store.ratelimit),
+# counted per user for logged-in visitors and per REMOTE_ADDR otherwise.
+# A dict value can limit only some HTTP methods and add a limit per value
+# of a POST field, e.g. per username for login attempts.
+# Behind a reverse proxy REMOTE_ADDR must be the client address.
+# Set to {} to disable, e.g. while running python manage.py loadtest.
+RATE_LIMITS = {
+    'add_to_cart': '30/m',
+    'increase_quantity': '60/m',
+    'decrease_quantity': '60/m',
+    'remove_from_cart': '60/m',
+    'login': {'rate': '20/m', 'methods': ['POST'], 'field': 'username'},
+    'register': {'rate': '10/m', 'methods': ['POST']},
+}
+
+
+# Background tasks (store.queue, python manage.py run_worker)
+
+TASK_RETRY_BACKOFF = 30
+TASK_LOCK_TIMEOUT = 600
+PRODUCT_IMAGE_MAX_SIZE = 1200
+
+
+# Product view/purchase counters (store.counters). Each process buffers
+# counts and writes them in one UPDATE after FLUSH_SIZE events or
+# FLUSH_INTERVAL seconds. Popularity halves every HALF_LIFE_DAYS
+# (python manage.py decay_popularity, run from cron).
+
+COUNTER_FLUSH_SIZE = 500
+COUNTER_FLUSH_INTERVAL = 30
+POPULARITY_PURCHASE_WEIGHT = 10
+POPULARITY_HALF_LIFE_DAYS = 7
+BESTSELLER_COUNT = 10
+
+
+# Active promo code rules are cached in each process for this many seconds.
+# Usage limits are always checked against the database.
+
+PROMO_RULES_TIMEOUT = 60
+
+
+# Order archival (python manage.py archive_orders); only delivered and
+# cancelled orders are archived.
+
+ARCHIVE_ORDERS_AFTER_DAYS = 365
+
+
+# Email
+# https://docs.djangoproject.com/en/5.2/topics/email/
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'SalePoint <noreply@salepoint.local>'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,3 +218,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored once per unique content under MEDIA_ROOT/hashed/.
+STORAGES = {
+    'default': {
+        'BACKEND': 'store.storage.HashedFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Hashed media URLs never change, so browsers may cache them for a year.
+# The production web server should send the same header for /media/hashed/.
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
@@ -1,18 +1,41 @@
-from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Order, OrderItem
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    Category, Product, Cart, CartItem, Order, OrderItem, OrderStatusHistory,
+    ArchivedOrder, ArchivedOrderItem, CustomerStats, PromoCode, Sale, Task, InvalidStatusTransition,
+)
+from .pricing import apply_sale, revert_sale
+from .tasks import assign_tracking_number, optimize_product_image, send_status_notification
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name')
+    list_display = ('id', 'name', 'parent', 'depth')
+    list_filter = ('depth',)
     search_fields = ('name',)
+    readonly_fields = ('path', 'depth')
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'price', 'old_price', 'is_available')
-    list_filter = ('is_available', 'category')
+    list_display = ('id', 'name', 'price', 'old_price', 'is_available', 'sale')
+    list_filter = ('is_available', 'category', 'sale')
     search_fields = ('name',)
+    readonly_fields = ('sale', 'regular_old_price')
+    actions = ['create_sale']
+
+    @admin.action(description='Устроить распродажу для выбранных товаров')
+    def create_sale(self, request, queryset):
+        ids = ','.join(str(pk) for pk in queryset.order_by('id').values_list('id', flat=True))
+        return HttpResponseRedirect(reverse('admin:store_sale_add') + '?product_ids=' + ids)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.image and 'image' in form.changed_data:
+            optimize_product_image.delay(product_id=obj.id)
 
 
 @admin.register(Cart)
@@ -25,8 +48,26 @@ class CartItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'cart', 'product', 'quantity')
 
 
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        order = self.instance
+        if order.pk and status != order.status and not order.can_transition_to(status):
+            allowed = [label for value, label in Order.STATUS_CHOICES if order.can_transition_to(value)]
+            raise forms.ValidationError(
+                f"Из статуса «{order.get_status_display()}» можно перейти только в: "
+                + (", ".join(allowed) or "—")
+            )
+        return status
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    form = OrderAdminForm
     list_display = (
         'id', 'user', 'name', 'phone',
         'delivery_type', 'payment_type',
@@ -37,12 +78,133 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ('phone', 'name', 'tracking_number')
 
     def save_model(self, request, obj, form, change):
-        if obj.status == "Отправлен" and not obj.tracking_number:
-            from .views import generate_tracking_code
-            obj.tracking_number = generate_tracking_code()
-        super().save_model(request, obj, form, change)
+        if not (change and 'status' in form.changed_data):
+            super().save_model(request, obj, form, change)
+            if not change:
+                OrderStatusHistory.objects.create(order_id=obj.id, to_status=obj.status, changed_by=request.user)
+            return
+
+        # Статус меняется только условным UPDATE, остальные поля — обычным save().
+        new_status = obj.status
+        obj.status = form.initial['status']
+        other_fields = [f for f in form.changed_data if f != 'status']
+        if other_fields:
+            obj.save(update_fields=other_fields + ['updated_at'])
+        try:
+            obj.transition_to(new_status, changed_by=request.user)
+        except InvalidStatusTransition as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+            return
+
+        if obj.status == Order.SHIPPED and not obj.tracking_number:
+            assign_tracking_number.delay(order_id=obj.id)
+        else:
+            send_status_notification.delay(order_id=obj.id)
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'order', 'product', 'quantity', 'price')
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ('product', 'quantity', 'price')
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'user', 'name', 'phone',
+        'delivery_type', 'payment_type',
+        'total_price', 'status', 'tracking_number',
+        'created_at', 'archived_at'
+    )
+    list_filter = ('status', 'delivery_type', 'payment_type', 'created_at')
+    search_fields = ('phone', 'name', 'tracking_number')
+    inlines = [ArchivedOrderItemInline]
+
+    # Архив только для чтения: заказы попадают сюда командой archive_orders.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OrderStatusHistory)
+class OrderStatusHistoryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order_id', 'from_status', 'to_status', 'changed_by', 'changed_at')
+    list_filter = ('to_status', 'changed_at')
+    search_fields = ('order_id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Sale)
+class SaleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'kind', 'value', 'status', 'starts_at', 'ends_at', 'applied_count')
+    list_filter = ('status', 'kind')
+    search_fields = ('name',)
+    readonly_fields = ('status', 'applied_count')
+    actions = ['apply_now', 'revert_now']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Идущую или завершённую распродажу менять нельзя — только отменить.
+        if obj and obj.status != Sale.PENDING:
+            return [f.name for f in Sale._meta.fields]
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.starts_at is None or obj.starts_at <= timezone.now():
+            changed = apply_sale(obj)
+            self.message_user(request, f"Цены снижены у {changed} товаров")
+
+    @admin.action(description='Запустить сейчас')
+    def apply_now(self, request, queryset):
+        changed = sum(apply_sale(sale) for sale in queryset.filter(status=Sale.PENDING))
+        self.message_user(request, f"Цены снижены у {changed} товаров")
+
+    @admin.action(description='Завершить и вернуть цены')
+    def revert_now(self, request, queryset):
+        changed = sum(revert_sale(sale) for sale in queryset.exclude(status=Sale.FINISHED))
+        self.message_user(request, f"Цены возвращены у {changed} товаров")
+
+
+@admin.register(PromoCode)
+class PromoCodeAdmin(admin.ModelAdmin):
+    list_display = (
+        'code', 'kind', 'value', 'min_total', 'valid_until',
+        'used_count', 'usage_limit', 'per_user_limit', 'is_active'
+    )
+    list_filter = ('is_active', 'kind')
+    search_fields = ('code',)
+    filter_horizontal = ('categories',)
+    readonly_fields = ('used_count',)
+
+
+@admin.register(CustomerStats)
+class CustomerStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'order_count', 'cancelled_count', 'lifetime_spend', 'last_order_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('order_count', 'cancelled_count', 'lifetime_spend', 'last_order_at')
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'created_at', 'updated_at')
@@ -0,0 +1,196 @@
+"""
+JSON API каталога для мобильного приложения.
+
+Ответы строятся из .values(), без создания экземпляров моделей.
+ETag зависит только от версии каталога и URL (для sort=popular — ещё и
+от версии рейтинга), поэтому повторный запрос с If-None-Match получает
+304 без обращения к базе.
+"""
+import base64
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from .caching import get_catalog_version, get_popularity_version
+from .catalog import SORTS, filter_products, subtree_product_counts
+from .models import Category, Product
+
+PRODUCT_FIELDS = [
+    "id", "name", "description", "price", "old_price", "discount",
+    "is_available", "category_id", "image",
+]
+DEFAULT_PRODUCT_FIELDS = [f for f in PRODUCT_FIELDS if f != "description"]
+CATEGORY_FIELDS = ["id", "name", "parent_id", "depth", "image", "product_count"]
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_IDS = 200
+# Больше не влезет в BIGINT: драйвер БД упал бы с OverflowError.
+MAX_ID = 2 ** 63 - 1
+
+
+class BadRequest(Exception):
+    pass
+
+
+def api_response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
+
+
+def catalog_etag(request, *args, **kwargs):
+    key = f"{get_catalog_version()}:{request.get_full_path()}"
+    if request.GET.get("sort") == "popular":
+        key = f"{get_popularity_version()}:{key}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def parse_fields(request, allowed, default):
+    raw = request.GET.get("fields")
+    if not raw:
+        return default
+    fields = [f for f in raw.split(",") if f]
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise BadRequest(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def parse_limit(request):
+    raw = request.GET.get("limit", "")
+    if not raw:
+        return DEFAULT_LIMIT
+    if not raw.isdigit() or int(raw) == 0:
+        raise BadRequest("limit должен быть положительным числом")
+    return min(int(raw), MAX_LIMIT)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        raise BadRequest("Некорректный cursor")
+    if not isinstance(values, list):
+        raise BadRequest("Некорректный cursor")
+    return values
+
+
+def keyset_q(ordering, values):
+    """
+    Условие "строго после values" для порядка ordering.
+
+    Для ("-price", "-id") и значений (500, 42) получается
+    price < 500 OR (price = 500 AND id < 42).
+    """
+    q = Q()
+    for i in range(len(ordering) - 1, -1, -1):
+        field = ordering[i].lstrip("-")
+        lookup = "lt" if ordering[i].startswith("-") else "gt"
+        step = Q(**{f"{field}__{lookup}": values[i]})
+        q = step if i == len(ordering) - 1 else step | (Q(**{field: values[i]}) & q)
+    return q
+
+
+def image_url(name):
+    return settings.MEDIA_URL + name if name else None
+
+
+def serialize(rows, fields):
+    # Поля сортировки выбираются для курсора, но в ответ попадают только fields.
+    with_image = "image" in fields
+    result = []
+    for row in rows:
+        item = {f: row[f] for f in fields}
+        if with_image:
+            item["image"] = image_url(item["image"])
+        result.append(item)
+    return result
+
+
+def handle_errors(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as exc:
+            return api_response({"error": str(exc)}, status=400)
+    return wrapper
+
+
+@require_GET
+@condition(etag_func=catalog_etag)
+@handle_errors
+def product_list(request):
+    """
+    GET /api/products/?fields=id,name&q=&category=&min=&max=&sort=&limit=&cursor=
+    GET /api/products/?ids=1,2,3
+    """
+    fields = parse_fields(request, PRODUCT_FIELDS, DEFAULT_PRODUCT_FIELDS)
+
+    ids = request.GET.get("ids")
+    if ids is not None:
+        parts = [p for p in ids.split(",") if p]
+        if (
+            len(parts) > MAX_IDS
+            or not all(p.isascii() and p.isdigit() and int(p) <= MAX_ID for p in parts)
+        ):
+            raise BadRequest(f"ids — список не более {MAX_IDS} чисел через запятую")
+        rows = Product.objects.filter(id__in=parts).order_by("id").values(*fields)
+        return api_response({"results": serialize(rows, fields)})
+
+    products, sort = filter_products(Product.objects.all(), request.GET)
+    ordering = SORTS[sort]
+    sort_fields = [f.lstrip("-") for f in ordering]
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(ordering):
+            raise BadRequest("cursor не соответствует сортировке")
+        try:
+            products = products.filter(keyset_q(ordering, values))
+        except (TypeError, ValueError):
+            # Значения курсора не подходят к типам полей сортировки.
+            raise BadRequest("Некорректный cursor")
+
+    limit = parse_limit(request)
+    rows = list(products.values(*dict.fromkeys(fields + sort_fields))[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][f] for f in sort_fields])
+
+    return api_response({"results": serialize(rows, fields), "next": next_cursor})
+
+
+@require_GET
+@condition(etag_func=catalog_etag)
+@handle_errors
+def category_list(request):
+    """GET /api/categories/?fields=id,name,product_count"""
+    fields = parse_fields(request, CATEGORY_FIELDS, CATEGORY_FIELDS)
+    db_fields = [f for f in fields if f != "product_count"]
+    rows = Category.objects.values(*dict.fromkeys(db_fields + ["id"]))
+
+    counts = subtree_product_counts() if "product_count" in fields else {}
+    results = []
+    for row in rows:
+        if "product_count" in fields:
+            row["product_count"] = counts.get(row["id"], 0)
+        if "image" in fields:
+            row["image"] = image_url(row["image"])
+        results.append({f: row[f] for f in fields})
+    return api_response({"results": results})
@@ -0,0 +1,69 @@
+"""
+Перенос завершённых заказов в архивные таблицы.
+
+Рабочие таблицы Order/OrderItem остаются маленькими, а архивные
+ArchivedOrder/ArchivedOrderItem читаются только для старых заказов.
+Каждая пачка переносится в своей транзакции, поэтому прерванный
+перенос можно просто запустить снова.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ORDER_FIELDS = [f.attname for f in Order._meta.concrete_fields]
+ITEM_FIELDS = ["order_id", "product_id", "quantity", "price"]
+
+
+def archivable_orders(days=None, statuses=None):
+    days = settings.ARCHIVE_ORDERS_AFTER_DAYS if days is None else days
+    statuses = Order.TERMINAL_STATUSES if statuses is None else statuses
+    cutoff = timezone.now() - timedelta(days=days)
+    return Order.objects.filter(status__in=statuses, updated_at__lt=cutoff)
+
+
+def archive_batch(queryset, batch_size):
+    """Переносит до batch_size заказов из queryset. Возвращает число перенесённых."""
+    with transaction.atomic():
+        # Одновременные запуски берут разные пачки, а не копируют одни и те же заказы.
+        ids = list(
+            queryset.select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        # Заказ, уже лежащий в архиве, второй раз не копируется — иначе
+        # его позиции задвоились бы: у них нет уникального ключа.
+        archived = set(ArchivedOrder.objects.filter(id__in=ids).values_list("id", flat=True))
+        new_ids = [pk for pk in ids if pk not in archived]
+        orders = Order.objects.filter(id__in=new_ids).values(*ORDER_FIELDS)
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**row) for row in orders])
+        items = OrderItem.objects.filter(order_id__in=new_ids).values(*ITEM_FIELDS)
+        ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**row) for row in items])
+
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def find_order(pk, **filters):
+    """Заказ из рабочей таблицы или, если его там нет, из архива."""
+    for model in (Order, ArchivedOrder):
+        order = model.objects.filter(pk=pk, **filters).first()
+        if order is not None:
+            return order
+    raise Http404("Заказ не найден")
+
+
+def user_orders(user):
+    """Все заказы пользователя, новые сначала: рабочие, затем архивные."""
+    return (
+        list(Order.objects.filter(user=user).order_by("-created_at"))
+        + list(ArchivedOrder.objects.filter(user=user).order_by("-created_at"))
+    )
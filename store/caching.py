@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "store:catalog_version"
+# Рейтинг популярности меняется каждые несколько секунд; его версия
+# сбрасывает только то, что зависит от рейтинга, а не весь каталог.
+POPULARITY_VERSION_KEY = "store:popularity_version"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+        return 2
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def get_popularity_version():
+    return get_version(POPULARITY_VERSION_KEY)
+
+
+def bump_popularity_version():
+    return bump_version(POPULARITY_VERSION_KEY)
+
+
+def catalog_cache_timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 15)
@@ -0,0 +1,124 @@
+"""
+Дерево категорий на материализованных путях.
+
+Поддерево категории — это все строки, чей path начинается с её path.
+Вместо LIKE 'prefix%' используется диапазон path >= prefix AND
+path < prefix_upper, который идёт по индексу в любой БД.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat, Substr
+
+from .caching import bump_catalog_version, catalog_cache_timeout, get_catalog_version, get_popularity_version
+from .models import Category, Product
+
+
+def subtree_bounds(path):
+    # Путь всегда заканчивается на "/", а "0" — следующий за ним символ.
+    return path, path[:-1] + "0"
+
+
+def subtree_q(category, field="path"):
+    lower, upper = subtree_bounds(category.path)
+    return Q(**{f"{field}__gte": lower, f"{field}__lt": upper})
+
+
+def subtree_products(category):
+    return Product.objects.filter(subtree_q(category, "category__path"))
+
+
+# Порядок сортировки каталога; id в конце делает порядок однозначным.
+SORTS = {
+    "new": ("-id",),
+    "price_asc": ("price", "id"),
+    "price_desc": ("-price", "-id"),
+    "name_asc": ("name", "id"),
+    "name_desc": ("-name", "-id"),
+    "discount": ("-discount", "-id"),
+    "popular": ("-popularity", "-id"),
+}
+
+
+def filter_products(products, params):
+    """Фильтры и сортировка главной страницы: q, category, min, max, sort."""
+    category_id = params.get("category", "")
+    if category_id.isdigit():
+        category = Category.objects.filter(pk=category_id).only("path").first()
+        if category:
+            products = products.filter(subtree_q(category, "category__path"))
+
+    q = params.get("q")
+    if q:
+        products = products.filter(Q(name__icontains=q) | Q(description__icontains=q))
+
+    min_price = params.get("min", "")
+    max_price = params.get("max", "")
+    if min_price.isdigit():
+        products = products.filter(price__gte=min_price)
+    if max_price.isdigit():
+        products = products.filter(price__lte=max_price)
+
+    sort = params.get("sort", "new")
+    if sort not in SORTS:
+        sort = "new"
+    return products.order_by(*SORTS[sort]), sort
+
+
+def move_subtree(old_path, new_path):
+    """Переписывает пути всех потомков одним UPDATE."""
+    lower, upper = subtree_bounds(old_path)
+    Category.objects.filter(path__gt=lower, path__lt=upper).update(
+        path=Concat(Value(new_path), Substr("path", len(old_path) + 1)),
+        depth=F("depth") + (new_path.count("/") - old_path.count("/")),
+    )
+    transaction.on_commit(bump_catalog_version)
+
+
+def cached(key, builder):
+    key = f"store:{key}:{get_catalog_version()}"
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, catalog_cache_timeout())
+    return value
+
+
+def breadcrumbs(category):
+    def build():
+        return list(
+            Category.objects.filter(pk__in=category.ancestor_ids())
+            .order_by("depth")
+            .values("id", "name")
+        )
+    return cached(f"breadcrumbs:{category.pk}", build)
+
+
+def subtree_product_counts():
+    """Число товаров в поддереве каждой категории: {id: count}."""
+    def build():
+        direct = dict(
+            Category.objects.annotate(n=Count("products"))
+            .filter(n__gt=0)
+            .values_list("path", "n")
+        )
+        counts = Counter()
+        for path, n in direct.items():
+            for segment in path.split("/")[:-1]:
+                counts[int(segment)] += n
+        return dict(counts)
+    return cached("subtree_counts", build)
+
+
+def bestseller_ids():
+    """id самых популярных товаров; рейтинг идёт по индексу popularity."""
+    def build():
+        return set(
+            Product.objects.filter(popularity__gt=0)
+            .order_by(*SORTS["popular"])
+            .values_list("id", flat=True)[:settings.BESTSELLER_COUNT]
+        )
+    return cached(f"bestsellers:{get_popularity_version()}", build)
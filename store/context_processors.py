@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from .caching import get_catalog_version, catalog_cache_timeout
+from .catalog import bestseller_ids
+
+
+def catalog(request):
+    return {
+        "catalog_version": get_catalog_version(),
+        "catalog_cache_timeout": catalog_cache_timeout(),
+        # Читается из кэша один раз за запрос и только там, где есть карточки.
+        "bestseller_ids": SimpleLazyObject(bestseller_ids),
+    }
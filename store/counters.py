@@ -0,0 +1,120 @@
+"""
+Буферизованные счётчики просмотров и покупок товаров.
+
+UPDATE на каждый просмотр выстраивал бы запросы в очередь на блокировке
+БД. Вместо этого каждый процесс копит счётчики в памяти и записывает их
+одним UPDATE, когда набралось COUNTER_FLUSH_SIZE событий или прошло
+COUNTER_FLUSH_INTERVAL секунд. При падении процесса теряются только
+несохранённые просмотры — для рейтинга популярности это допустимо.
+
+Запись меняет рейтинг, поэтому после неё повышается версия рейтинга:
+она входит в ключи кэша только того, что от рейтинга зависит
+(sort=popular и список хитов продаж), а остальной кэш каталога живёт
+дальше.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .caching import bump_popularity_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_buffer = {"views": Counter(), "purchases": Counter()}
+_pending = 0
+_last_flush = time.monotonic()
+
+
+def record_view(product_id):
+    _record("views", {int(product_id): 1})
+
+
+def record_purchases(quantities):
+    """quantities: {product_id: количество}."""
+    _record("purchases", quantities)
+
+
+def _record(kind, counts):
+    global _pending
+    with _lock:
+        _buffer[kind].update(counts)
+        _pending += len(counts)
+        due = (
+            _pending >= settings.COUNTER_FLUSH_SIZE
+            or time.monotonic() - _last_flush >= settings.COUNTER_FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def _take():
+    global _buffer, _pending, _last_flush
+    with _lock:
+        taken = _buffer
+        _buffer = {"views": Counter(), "purchases": Counter()}
+        _pending = 0
+        _last_flush = time.monotonic()
+    return taken["views"], taken["purchases"]
+
+
+def discard():
+    """Сбрасывает буфер без записи (для тестов)."""
+    _take()
+
+
+def _delta(counts, weight=1):
+    whens = [When(id=pk, then=Value(n * weight)) for pk, n in counts.items()]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def flush():
+    """Записывает накопленные счётчики одним UPDATE. Возвращает число товаров."""
+    views, purchases = _take()
+    ids = set(views) | set(purchases)
+    if not ids:
+        return 0
+
+    weight = settings.POPULARITY_PURCHASE_WEIGHT
+    try:
+        updated = Product.objects.filter(id__in=ids).update(
+            view_count=F("view_count") + _delta(views),
+            purchase_count=F("purchase_count") + _delta(purchases),
+            popularity=F("popularity") + _delta(views) + _delta(purchases, weight),
+        )
+    except DatabaseError:
+        logger.exception("Не удалось записать счётчики товаров")
+        with _lock:
+            _buffer["views"].update(views)
+            _buffer["purchases"].update(purchases)
+        return 0
+    if updated:
+        bump_popularity_version()
+    return len(ids)
+
+
+def count_product_view(view):
+    """
+    Считает просмотр товара.
+
+    Страницу товара анонимам отдаёт кэш без вызова view, поэтому
+    AnonymousPageCacheMiddleware вызывает on_page_cache_hit сама.
+    """
+    @wraps(view)
+    def wrapper(request, pk, *args, **kwargs):
+        record_view(pk)
+        return view(request, pk, *args, **kwargs)
+
+    wrapper.on_page_cache_hit = lambda request, pk, *args, **kwargs: record_view(pk)
+    return wrapper
+
+
+atexit.register(flush)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.pricing import BATCH_SIZE, process_due_sales
+
+
+class Command(BaseCommand):
+    help = "Запускает наступившие и завершает истёкшие распродажи (запускать из cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started, finished = process_due_sales(batch_size=options["batch_size"])
+        self.stdout.write(f"Запущено распродаж: {started}, завершено: {finished}")
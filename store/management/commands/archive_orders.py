@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.archive import archivable_orders, archive_batch
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = "Переносит старые завершённые заказы в архивные таблицы"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.ARCHIVE_ORDERS_AFTER_DAYS,
+            help="Архивировать заказы, не менявшиеся дольше стольких дней",
+        )
+        parser.add_argument(
+            "--status", action="append", dest="statuses", type=int,
+            choices=Order.TERMINAL_STATUSES,
+            help="Код конечного статуса; можно указать несколько раз",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--max-batches", type=int, help="Остановиться после стольких пачек")
+
+    def handle(self, *args, **options):
+        queryset = archivable_orders(options["days"], options["statuses"])
+        total = batches = 0
+        while options["max_batches"] is None or batches < options["max_batches"]:
+            moved = archive_batch(queryset, options["batch_size"])
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            self.stdout.write(f"Пачка {batches}: перенесено {moved}")
+        self.stdout.write(f"Всего перенесено заказов: {total}")
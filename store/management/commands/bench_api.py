@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from store import api
+
+
+class Command(BaseCommand):
+    help = "Замеряет пропускную способность JSON API каталога на текущих данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=api.MAX_LIMIT)
+        parser.add_argument(
+            "--target", type=int, default=20000,
+            help="Минимально допустимое число сериализованных товаров в секунду",
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        cases = [
+            ("products", {"limit": options["limit"]}),
+            ("products sparse", {"limit": options["limit"], "fields": "id,name,price"}),
+            ("products by price", {"limit": options["limit"], "sort": "price_asc"}),
+        ]
+
+        self.stdout.write(f"{'запрос':<20}{'запросов/с':>12}{'товаров/с':>12}")
+        worst = None
+        for label, params in cases:
+            rows = 0
+            started = time.perf_counter()
+            for _ in range(options["iterations"]):
+                response = api.product_list(factory.get("/api/products/", params))
+                rows += response.content.count(b'"id":')
+            elapsed = time.perf_counter() - started
+            rate = rows / elapsed
+            worst = rate if worst is None else min(worst, rate)
+            self.stdout.write(f"{label:<20}{options['iterations'] / elapsed:>12.0f}{rate:>12.0f}")
+
+        if not worst:
+            raise CommandError("В каталоге нет товаров")
+        if worst < options["target"]:
+            raise CommandError(f"Пропускная способность {worst:.0f} товаров/с ниже цели {options['target']}")
+        self.stdout.write(f"Цель {options['target']} товаров/с достигнута")
@@ -0,0 +1,51 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+
+from store.middleware import RateLimitMiddleware
+
+
+class Command(BaseCommand):
+    help = "Замеряет накладные расходы RateLimitMiddleware на один запрос"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000)
+        parser.add_argument(
+            "--target", type=float, default=100,
+            help="Максимально допустимая добавка к запросу, мкс",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        middleware = RateLimitMiddleware(lambda request: HttpResponse())
+        match = resolve("/add-to-cart/1/")
+
+        def run(limits):
+            # Свой «адрес» на каждый прогон, чтобы не трогать чужие счётчики в кэше.
+            request = RequestFactory().post("/add-to-cart/1/", REMOTE_ADDR=f"bench-{uuid.uuid4().hex}")
+            request.resolver_match = match
+            with override_settings(RATE_LIMITS=limits):
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    middleware.process_view(request, match.func, (), {})
+                return (time.perf_counter() - started) / iterations * 1e6
+
+        cases = [
+            ("без лимита", {}),
+            ("разрешён", {"add_to_cart": f"{iterations * 2}/m"}),
+            ("отклонён (429)", {"add_to_cart": "1/d"}),
+        ]
+        self.stdout.write(f"{'случай':<16}{'мкс/запрос':>12}")
+        timings = {}
+        for label, limits in cases:
+            timings[label] = run(limits)
+            self.stdout.write(f"{label:<16}{timings[label]:>12.1f}")
+
+        overhead = max(timings["разрешён"], timings["отклонён (429)"]) - timings["без лимита"]
+        if overhead > options["target"]:
+            raise CommandError(f"Накладные расходы {overhead:.1f} мкс выше цели {options['target']}")
+        self.stdout.write(f"Накладные расходы {overhead:.1f} мкс, цель {options['target']} мкс достигнута")
@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.template.loader import get_template
+from django.test import RequestFactory
+
+from store.catalog import breadcrumbs, subtree_products
+from store.models import Category, Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    help = "Замеряет время рендеринга шаблонов магазина на текущих данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("template", nargs="*", help="Имена шаблонов, например store/home.html")
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = SessionBase()
+
+        cases = self.build_cases()
+        selected = options["template"] or list(cases)
+        iterations = options["iterations"]
+
+        self.stdout.write(f"{'шаблон':<36}{'первый, мс':>12}{'p50, мс':>10}{'p95, мс':>10}")
+        for name in selected:
+            if name not in cases:
+                self.stderr.write(f"{name}: нет данных для рендеринга, пропущен")
+                continue
+            template = get_template(name)
+            context = cases[name]
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                template.render(context, request)
+                timings.append((time.perf_counter() - started) * 1000)
+            first = timings[0]
+            timings.sort()
+            p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+            self.stdout.write(
+                f"{name:<36}{first:>12.2f}"
+                f"{statistics.median(timings):>10.2f}{p95:>10.2f}"
+            )
+
+    def build_cases(self):
+        categories = Category.objects.filter(parent=None)
+        page_obj = Paginator(Product.objects.order_by("-id"), 8).get_page(1)
+        cases = {
+            "store/home.html": {"page_obj": page_obj, "categories": categories, "sort": "new"},
+            "store/categories.html": {"categories": categories},
+            "store/delivery.html": {},
+            "store/help.html": {},
+        }
+
+        product = Product.objects.first()
+        if product:
+            cases["store/product_detail.html"] = {"product": product}
+            cases["store/category_detail.html"] = {
+                "category": product.category,
+                "children": product.category.children.all(),
+                "breadcrumbs": breadcrumbs(product.category),
+                "products": subtree_products(product.category),
+            }
+
+        order = Order.objects.first()
+        if order:
+            items = (
+                OrderItem.objects.filter(order=order)
+                .select_related("product")
+                .annotate(line_total=F("quantity") * F("price"))
+            )
+            cases["store/order_detail.html"] = {"order": order, "items": items}
+        return cases
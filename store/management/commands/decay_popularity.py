@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from store.caching import bump_popularity_version
+from store.models import PopularityDecay, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Уменьшает рейтинг популярности товаров со временем (запускать из cron). "
+        "Рейтинг уменьшается за время, фактически прошедшее с прошлого запуска."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--half-life-days", type=float, default=settings.POPULARITY_HALF_LIFE_DAYS)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        with transaction.atomic():
+            state, created = PopularityDecay.objects.get_or_create(pk=1, defaults={"decayed_at": now})
+            if created:
+                self.stdout.write("Первый запуск: отсчёт времени начат, рейтинг не изменён")
+                return
+            # Условный UPDATE не даёт двум одновременным запускам уменьшить рейтинг дважды.
+            claimed = PopularityDecay.objects.filter(pk=1, decayed_at=state.decayed_at).update(decayed_at=now)
+            if not claimed:
+                self.stdout.write("Рейтинг уже уменьшает другой запуск")
+                return
+
+            hours = max((now - state.decayed_at).total_seconds(), 0) / 3600
+            factor = 0.5 ** (hours / (options["half_life_days"] * 24))
+            # Почти нулевые рейтинги обнуляем, чтобы они не переписывались каждый раз.
+            Product.objects.filter(popularity__gt=0, popularity__lt=0.01).update(popularity=0)
+            updated = Product.objects.filter(popularity__gt=0).update(popularity=F("popularity") * factor)
+        if updated:
+            bump_popularity_version()
+        self.stdout.write(f"За {hours:.1f} ч рейтинг уменьшен в {1 / factor:.3f} раза у {updated} товаров")
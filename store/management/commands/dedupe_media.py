@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from store.caching import bump_catalog_version
+from store.models import Category, Product
+from store.storage import HASHED_PREFIX, is_hashed
+
+MODELS = (Product, Category)
+
+
+def referenced_names():
+    names = set()
+    for model in MODELS:
+        names.update(model.objects.exclude(image="").exclude(image=None).values_list("image", flat=True))
+    return names
+
+
+def walk(storage, path):
+    dirs, files = storage.listdir(path)
+    for name in files:
+        yield f"{path}{name}"
+    for name in dirs:
+        yield from walk(storage, f"{path}{name}/")
+
+
+class Command(BaseCommand):
+    help = "Переносит существующие медиафайлы в хранилище с адресацией по содержимому"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--keep-originals", action="store_true", help="Не удалять старые файлы")
+        parser.add_argument("--prune", action="store_true", help="Удалить хэшированные файлы без ссылок")
+        parser.add_argument(
+            "--grace-minutes", type=int, default=60,
+            help="Не удалять файлы моложе N минут: ссылку на них ещё может сохранять админка",
+        )
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        legacy = sorted(name for name in referenced_names() if not is_hashed(name))
+
+        def migrate(name):
+            if not storage.exists(name):
+                return name, None
+            with storage.open(name, "rb") as f:
+                return name, storage.save(name, f)
+
+        # Хэширование и копирование — ввод-вывод, поэтому потоки действительно параллельны.
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            results = list(pool.map(migrate, legacy))
+
+        mapping = {old: new for old, new in results if new}
+        for old, new in results:
+            if new is None:
+                self.stderr.write(f"Файл не найден: {old}")
+
+        with transaction.atomic():
+            pairs = list(mapping.items())
+            for start in range(0, len(pairs), options["batch_size"]):
+                chunk = pairs[start:start + options["batch_size"]]
+                image = Case(*[When(image=old, then=Value(new)) for old, new in chunk])
+                for model in MODELS:
+                    model.objects.filter(image__in=[old for old, _ in chunk]).update(image=image)
+        if mapping:
+            bump_catalog_version()
+
+        if not options["keep_originals"]:
+            for old in mapping:
+                storage.delete(old)
+
+        pruned = 0
+        if options["prune"] and storage.exists(HASHED_PREFIX):
+            # Свежий файл мог быть загружен, а товар с ним ещё не сохранён;
+            # .tmp — файлы, которые хранилище прямо сейчас записывает.
+            cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+            used = referenced_names()
+            for name in walk(storage, HASHED_PREFIX):
+                if name in used or name.endswith(".tmp"):
+                    continue
+                try:
+                    if storage.get_modified_time(name) > cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                storage.delete(name)
+                pruned += 1
+
+        unique = len(set(mapping.values()))
+        self.stdout.write(
+            f"Перенесено файлов: {len(mapping)}, уникальных: {unique}, удалено лишних: {pruned}"
+        )
@@ -0,0 +1,230 @@
+"""
+Нагрузочный тест запущенного экземпляра SalePoint.
+
+Использует только стандартную библиотеку: каждый виртуальный покупатель
+проходит сценарий поиск → значок корзины → товар → корзина → вход → оформление заказа
+со своим набором cookie. Покупатели приходят по пуассоновскому потоку
+с заданной интенсивностью, паузы между шагами распределены
+экспоненциально.
+
+    python manage.py loadtest --base-url http://127.0.0.1:8000 \\
+        --rate 5 --duration 60 --username demo --password secret
+
+Все покупатели идут с одного адреса, поэтому упираются в RATE_LIMITS
+сервера. Ответы 429 считаются отдельно от ошибок; чтобы измерить саму
+производительность, запустите сервер с RATE_LIMITS = {}.
+"""
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+
+STEPS = ["search", "cart_status", "product_detail", "add_to_cart", "cart", "login", "checkout"]
+SEARCH_TERMS = ["iphone", "samsung", "xiaomi", "наушники", "чехол", "pro", "watch", ""]
+PRODUCT_LINK = re.compile(r'href="/product/(\d+)/"')
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # Каждый шаг измеряется отдельно, редиректы не отслеживаются.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.journeys = 0
+
+    def record(self, step, latency, ok, throttled=False):
+        with self.lock:
+            self.latencies[step].append(latency)
+            if throttled:
+                self.throttled[step] += 1
+            elif not ok:
+                self.errors[step] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for step in STEPS:
+            latencies = self.latencies.get(step, [])
+            if not latencies:
+                continue
+            count = len(latencies)
+            rows.append({
+                "step": step,
+                "count": count,
+                "rps": count / elapsed if elapsed else 0.0,
+                "p50": percentile(latencies, 50) * 1000,
+                "p95": percentile(latencies, 95) * 1000,
+                "p99": percentile(latencies, 99) * 1000,
+                "error_rate": self.errors.get(step, 0) / count * 100,
+                "throttled_rate": self.throttled.get(step, 0) / count * 100,
+            })
+        return rows
+
+
+class Shopper:
+    def __init__(self, base_url, stats, timeout):
+        self.base_url = base_url
+        self.stats = stats
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, step, path, data=None, params=None):
+        url = urljoin(self.base_url, path)
+        if params:
+            url += "?" + urlencode(params)
+        body = None
+        headers = {"User-Agent": "SalePoint-loadtest"}
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.csrf_token())
+            body = urlencode(data).encode()
+            headers["Referer"] = url
+        started = time.perf_counter()
+        html = ""
+        throttled = False
+        try:
+            with self.opener.open(Request(url, body, headers), timeout=self.timeout) as response:
+                html = response.read().decode("utf-8", "replace")
+            ok = True
+        except HTTPError as exc:
+            ok = exc.code < 400
+            throttled = exc.code == 429
+        except (URLError, OSError):
+            ok = False
+        self.stats.record(step, time.perf_counter() - started, ok, throttled)
+        return html
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест сценариев поиск → корзина → оформление заказа"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/")
+        parser.add_argument("--rate", type=float, default=2.0, help="Новых покупателей в секунду")
+        parser.add_argument("--duration", type=float, default=30.0, help="Длительность подачи нагрузки, сек.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Максимум одновременных покупателей")
+        parser.add_argument("--think-time", type=float, default=1.0, help="Средняя пауза между шагами, сек.")
+        parser.add_argument("--checkout-ratio", type=float, default=0.3, help="Доля покупателей, оформляющих заказ")
+        parser.add_argument("--username", help="Пользователь для входа и оформления заказа")
+        parser.add_argument("--password")
+        parser.add_argument("--timeout", type=float, default=10.0)
+        parser.add_argument("--seed", type=int)
+
+    def handle(self, *args, **options):
+        if options["rate"] <= 0:
+            raise CommandError("--rate должен быть больше нуля")
+        self.options = options
+        self.random = random.Random(options["seed"])
+        self.stats = Stats()
+        base_url = options["base_url"].rstrip("/") + "/"
+
+        self.product_ids = self.discover_products(base_url)
+        if not self.product_ids:
+            raise CommandError(f"На {base_url} не найдено ни одного товара")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            deadline = started + options["duration"]
+            next_arrival = started
+            while next_arrival < deadline:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.journey, base_url, self.random.random())
+                next_arrival += self.random.expovariate(options["rate"])
+        elapsed = time.perf_counter() - started
+
+        self.print_report(elapsed)
+
+    def discover_products(self, base_url):
+        shopper = Shopper(base_url, Stats(), self.options["timeout"])
+        return sorted({int(pk) for pk in PRODUCT_LINK.findall(shopper.request("discover", ""))})
+
+    def think(self, rng):
+        mean = self.options["think_time"]
+        if mean > 0:
+            time.sleep(rng.expovariate(1 / mean))
+
+    def journey(self, base_url, seed):
+        rng = random.Random(seed)
+        shopper = Shopper(base_url, self.stats, self.options["timeout"])
+        try:
+            shopper.request("search", "", params={"q": rng.choice(SEARCH_TERMS)})
+            # Как и браузер: значок корзины и CSRF-cookie приходят отдельным запросом.
+            shopper.request("cart_status", "cart/status/")
+            self.think(rng)
+
+            product_id = rng.choice(self.product_ids)
+            shopper.request("product_detail", f"product/{product_id}/")
+            self.think(rng)
+
+            shopper.request("add_to_cart", f"add-to-cart/{product_id}/", data={"quantity": rng.randint(1, 3)})
+            shopper.request("cart", "cart/")
+
+            buys = rng.random() < self.options["checkout_ratio"]
+            if not (buys and self.options["username"]):
+                return
+            self.think(rng)
+
+            shopper.request("login", "accounts/login/")
+            shopper.request("login", "accounts/login/", data={
+                "username": self.options["username"],
+                "password": self.options["password"] or "",
+            })
+            self.think(rng)
+
+            shopper.request("checkout", "checkout/")
+            shopper.request("checkout", "checkout/", data={
+                "name": self.options["username"],
+                "phone": "+7 700 000 00 00",
+                "delivery_type": "pickup",
+                "payment_type": "cash",
+            })
+        finally:
+            with self.stats.lock:
+                self.stats.journeys += 1
+
+    def print_report(self, elapsed):
+        self.stdout.write(f"Покупателей: {self.stats.journeys}, время: {elapsed:.1f} с")
+        self.stdout.write(
+            f"{'шаг':<16}{'запросов':>10}{'rps':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+            f"{'ошибки, %':>11}{'429, %':>8}"
+        )
+        rows = self.stats.report(elapsed)
+        for row in rows:
+            self.stdout.write(
+                f"{row['step']:<16}{row['count']:>10}{row['rps']:>8.1f}{row['p50']:>10.1f}"
+                f"{row['p95']:>10.1f}{row['p99']:>10.1f}{row['error_rate']:>11.1f}{row['throttled_rate']:>8.1f}"
+            )
+        if any(row["throttled_rate"] for row in rows):
+            self.stdout.write(
+                "Часть запросов отклонена ограничением частоты (429): задержки занижены. "
+                "Для замера запустите сервер с RATE_LIMITS = {}."
+            )
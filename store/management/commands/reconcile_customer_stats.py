@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+
+from store.models import ArchivedOrder, CustomerStats, Order
+
+
+def aggregate(model):
+    return (
+        model.objects.filter(user__isnull=False)
+        .values("user_id")
+        .annotate(
+            order_count=Count("id"),
+            cancelled_count=Count("id", filter=Q(status=Order.CANCELLED)),
+            lifetime_spend=Sum("total_price", filter=~Q(status=Order.CANCELLED), default=0),
+            last_order_at=Max("created_at"),
+        )
+        .order_by()
+    )
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает статистику заказов покупателей одним групповым запросом"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Подсчёт и запись в одной транзакции, чтобы между ними не вклинилась
+        # чужая запись, которую пересчёт затёр бы устаревшими числами.
+        with transaction.atomic():
+            stats = {}
+            # Архивные заказы лежат в своей таблице, поэтому запросов два — по одному на таблицу.
+            for model in (Order, ArchivedOrder):
+                for row in aggregate(model):
+                    current = stats.setdefault(row["user_id"], CustomerStats(user_id=row["user_id"]))
+                    current.order_count += row["order_count"]
+                    current.cancelled_count += row["cancelled_count"]
+                    current.lifetime_spend += row["lifetime_spend"]
+                    if current.last_order_at is None or row["last_order_at"] > current.last_order_at:
+                        current.last_order_at = row["last_order_at"]
+
+            CustomerStats.objects.bulk_create(
+                stats.values(),
+                batch_size=options["batch_size"],
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=["order_count", "cancelled_count", "lifetime_spend", "last_order_at"],
+            )
+            # Подзапросы вместо списка id: список из сотен тысяч id не влез бы в один запрос.
+            removed, _ = CustomerStats.objects.filter(
+                ~Exists(Order.objects.filter(user=OuterRef("user"))),
+                ~Exists(ArchivedOrder.objects.filter(user=OuterRef("user"))),
+            ).delete()
+
+        self.stdout.write(f"Покупателей пересчитано: {len(stats)}, удалено пустых записей: {removed}")
@@ -0,0 +1,76 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from store.models import Category, Sale
+from store.pricing import BATCH_SIZE, apply_sale, revert_sale
+
+
+def aware_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = "Снижает цены группы товаров сразу или по расписанию"
+
+    def add_arguments(self, parser):
+        change = parser.add_mutually_exclusive_group(required=True)
+        change.add_argument("--percent", type=int, help="Скидка в процентах")
+        change.add_argument("--amount", type=int, help="Скидка в тенге")
+        change.add_argument("--revert", type=int, metavar="SALE_ID", help="Отменить распродажу")
+
+        parser.add_argument("--name", default="Распродажа")
+        parser.add_argument("--category", type=int, help="id категории (вместе с подкатегориями)")
+        parser.add_argument("--available-only", action="store_true")
+        parser.add_argument("--ids", default="", help="id товаров через запятую")
+        parser.add_argument(
+            "--round", dest="rounding", type=int, default=Sale.ROUND_NONE,
+            choices=[value for value, _ in Sale.ROUNDING_CHOICES],
+        )
+        parser.add_argument("--starts", type=aware_datetime, help="Начало, например 2026-11-27T00:00")
+        parser.add_argument("--ends", type=aware_datetime, help="Окончание")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        if options["revert"]:
+            sale = Sale.objects.filter(pk=options["revert"]).first()
+            if sale is None:
+                raise CommandError(f"Распродажа {options['revert']} не найдена")
+            reverted = revert_sale(sale, batch_size)
+            self.stdout.write(f"Цены возвращены у {reverted} товаров")
+            return
+
+        category = None
+        if options["category"]:
+            category = Category.objects.filter(pk=options["category"]).first()
+            if category is None:
+                raise CommandError(f"Категория {options['category']} не найдена")
+
+        sale = Sale(
+            name=options["name"],
+            kind=Sale.PERCENT if options["percent"] is not None else Sale.FIXED,
+            value=options["percent"] if options["percent"] is not None else options["amount"],
+            rounding=options["rounding"],
+            category=category,
+            available_only=options["available_only"],
+            product_ids=options["ids"],
+            starts_at=options["starts"],
+            ends_at=options["ends"],
+        )
+        try:
+            sale.full_clean()
+        except ValidationError as exc:
+            raise CommandError("; ".join(f"{k}: {' '.join(v)}" for k, v in exc.message_dict.items()))
+        sale.save()
+
+        if sale.starts_at is None or sale.starts_at <= timezone.now():
+            changed = apply_sale(sale, batch_size)
+            self.stdout.write(f"Распродажа {sale.pk}: цены снижены у {changed} товаров")
+        else:
+            self.stdout.write(f"Распродажа {sale.pk} запланирована на {sale.starts_at:%Y-%m-%d %H:%M}")
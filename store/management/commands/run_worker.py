@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.queue import run_batch
+
+
+class Command(BaseCommand):
+    help = "Выполняет фоновые задачи из очереди store.Task"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--sleep", type=float, default=1.0, help="Пауза при пустой очереди, сек.")
+        parser.add_argument("--once", action="store_true", help="Выполнить готовые задачи и выйти")
+
+    def handle(self, *args, **options):
+        processed = 0
+        try:
+            while True:
+                count = run_batch(options["batch_size"], options["threads"])
+                processed += count
+                if count:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Выполнено задач: {processed}")
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode
+
+from . import ratelimit
+from .caching import get_catalog_version, get_popularity_version, catalog_cache_timeout
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэширует целые страницы каталога для анонимных посетителей без корзины.
+
+    Ключ кэша включает версию каталога, поэтому любое изменение товаров
+    или категорий сразу делает старые страницы недоступными. Значок
+    корзины и CSRF-токен страница получает отдельным запросом к
+    cart_status, так что в закэшированном HTML нет ничего личного.
+    Ответ, который ставит cookie или использовал CSRF-токен, в кэш не
+    попадает и публичным не помечается.
+
+    В ключ входят только параметры из CACHE_KEY_PARAMS: метки рекламных
+    кампаний и прочий мусор в URL не плодят копий одной страницы.
+    """
+
+    CACHE_KEY_PARAMS = ("q", "category", "min", "max", "sort", "page")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.url_names = set(getattr(settings, "ANONYMOUS_PAGE_CACHE_URLS", []))
+        self.max_age = getattr(settings, "ANONYMOUS_PAGE_CACHE_MAX_AGE", 60)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header("X-Page-Cache"):
+            return response
+
+        cache_key = getattr(request, "_page_cache_key", None)
+        if cache_key is None:
+            if self.is_catalog_page(request):
+                patch_cache_control(response, private=True)
+            return response
+
+        if response.cookies or request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+            patch_cache_control(response, private=True)
+            return response
+
+        if response.status_code == 200 and not response.streaming:
+            headers = {k: v for k, v in response.items() if k.lower() not in ("vary", "cache-control")}
+            cache.set(cache_key, (response.content, headers), catalog_cache_timeout())
+            self.patch_public(response)
+            response["X-Page-Cache"] = "MISS"
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.is_catalog_page(request) or not self.is_anonymous(request):
+            return None
+
+        version = get_catalog_version()
+        if request.GET.get("sort") == "popular":
+            version = "%s.%s" % (version, get_popularity_version())
+        cache_key = "store:page:%s:%s" % (version, self.cache_key_path(request))
+        cached = cache.get(cache_key)
+        if cached is None:
+            request._page_cache_key = cache_key
+            # Шаблоны не выводят CSRF-токен в страницу, которая уйдёт в кэш.
+            request.page_cacheable = True
+            return None
+
+        hook = getattr(view_func, "on_page_cache_hit", None)
+        if hook is not None:
+            hook(request, *view_args, **view_kwargs)
+
+        content, headers = cached
+        response = HttpResponse(content)
+        for name, value in headers.items():
+            response[name] = value
+        self.patch_public(response)
+        response["X-Page-Cache"] = "HIT"
+        return response
+
+    def cache_key_path(self, request):
+        params = sorted(
+            (name, value)
+            for name in self.CACHE_KEY_PARAMS
+            for value in request.GET.getlist(name)
+        )
+        return "%s?%s" % (request.path, urlencode(params))
+
+    def is_catalog_page(self, request):
+        match = request.resolver_match
+        return (
+            request.method in ("GET", "HEAD")
+            and match is not None
+            and match.url_name in self.url_names
+        )
+
+    def is_anonymous(self, request):
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return True
+        return not request.user.is_authenticated and not request.session.get("cart")
+
+    def patch_public(self, response):
+        patch_vary_headers(response, ["Cookie"])
+        patch_cache_control(response, public=True, max_age=self.max_age)
+
+
+class RateLimitMiddleware:
+    """
+    Ограничивает частоту запросов к view из settings.RATE_LIMITS.
+    Значение — "число/период" или словарь {"rate": ..., "methods": [...],
+    "field": ...}: methods ограничивает только перечисленные методы, field
+    добавляет лимит по значению поля POST. Лимит считается отдельно для
+    каждого пользователя, а для анонимов — для каждого IP.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        config = getattr(settings, "RATE_LIMITS", {}).get(match.url_name) if match else None
+        if config is None:
+            return None
+        if isinstance(config, str):
+            config = {"rate": config}
+        if config.get("methods") and request.method not in config["methods"]:
+            return None
+        return ratelimit.check(request, match.url_name, config["rate"], field=config.get("field"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:09
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(old_price__gt=models.F('price'), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('old_price'), '-', models.F('price')), '*', models.Value(100)), '/', models.F('old_price'))), default=models.Value(0)), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['discount', 'id'], name='store_product_discount_idx'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+STATUS_CODES = {
+    'Обрабатывается': 10,
+    'Оплачено': 20,
+    'Отправлен': 30,
+    'Доставлен': 40,
+    'Отменён': 50,
+}
+BATCH_SIZE = 1000
+
+
+def batches(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last + 1, BATCH_SIZE):
+        yield model.objects.filter(pk__gte=start, pk__lt=start + BATCH_SIZE)
+
+
+def text_to_code(apps, schema_editor):
+    for name in ('Order', 'ArchivedOrder'):
+        model = apps.get_model('store', name)
+        for batch in batches(model):
+            for text, code in STATUS_CODES.items():
+                batch.filter(status=text).update(status_code=code)
+            # Нестандартные строки, введённые вручную, считаем новыми заказами.
+            batch.filter(status_code__isnull=True).update(status_code=10)
+
+
+def code_to_text(apps, schema_editor):
+    for name in ('Order', 'ArchivedOrder'):
+        model = apps.get_model('store', name)
+        for batch in batches(model):
+            for text, code in STATUS_CODES.items():
+                batch.filter(status_code=code).update(status=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_order_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(db_index=True)),
+                ('from_status', models.PositiveSmallIntegerField(blank=True, choices=[(10, 'Обрабатывается'), (20, 'Оплачено'), (30, 'Отправлен'), (40, 'Доставлен'), (50, 'Отменён')], null=True)),
+                ('to_status', models.PositiveSmallIntegerField(choices=[(10, 'Обрабатывается'), (20, 'Оплачено'), (30, 'Отправлен'), (40, 'Доставлен'), (50, 'Отменён')])),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['changed_at', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(text_to_code, code_to_text),
+        migrations.RemoveField(
+            model_name='order',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='order',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(10, 'Обрабатывается'), (20, 'Оплачено'), (30, 'Отправлен'), (40, 'Доставлен'), (50, 'Отменён')], default=10),
+        ),
+        migrations.RemoveField(
+            model_name='archivedorder',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='archivedorder',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(10, 'Обрабатывается'), (20, 'Оплачено'), (30, 'Отправлен'), (40, 'Доставлен'), (50, 'Отменён')], default=10),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'updated_at'], name='store_order_status_updated'),
+        ),
+        migrations.AddField(
+            model_name='orderstatushistory',
+            name='changed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+CANCELLED = 50
+
+
+def seed_stats(apps, schema_editor):
+    # Тот же групповой запрос, что в reconcile_customer_stats, по каждой таблице заказов.
+    CustomerStats = apps.get_model('store', 'CustomerStats')
+    stats = {}
+    for name in ('Order', 'ArchivedOrder'):
+        rows = (
+            apps.get_model('store', name).objects.filter(user__isnull=False)
+            .values('user_id')
+            .annotate(
+                order_count=Count('id'),
+                cancelled_count=Count('id', filter=Q(status=CANCELLED)),
+                lifetime_spend=Sum('total_price', filter=~Q(status=CANCELLED), default=0),
+                last_order_at=Max('created_at'),
+            )
+            .order_by()
+        )
+        for row in rows:
+            current = stats.setdefault(row['user_id'], CustomerStats(user_id=row['user_id']))
+            current.order_count += row['order_count']
+            current.cancelled_count += row['cancelled_count']
+            current.lifetime_spend += row['lifetime_spend']
+            if current.last_order_at is None or row['last_order_at'] > current.last_order_at:
+                current.last_order_at = row['last_order_at']
+    CustomerStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('store', '0008_order_status_enum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.BigIntegerField(default=0)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(seed_stats, migrations.RunPython.noop),
+    ]
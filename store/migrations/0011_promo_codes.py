@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_product_popularity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromoCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('kind', models.CharField(choices=[('percent', 'Процент от суммы'), ('fixed', 'Фиксированная сумма')], default='percent', max_length=10)),
+                ('value', models.PositiveIntegerField()),
+                ('min_total', models.PositiveIntegerField(default=0)),
+                ('valid_from', models.DateTimeField(blank=True, null=True)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('usage_limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('per_user_limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('used_count', models.PositiveIntegerField(default=0)),
+                ('categories', models.ManyToManyField(blank=True, related_name='promo_codes', to='store.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PromoUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('used_count', models.PositiveIntegerField(default=0)),
+                ('promo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='store.promocode')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('promo', 'user'), name='store_promousage_promo_user')],
+            },
+        ),
+    ]
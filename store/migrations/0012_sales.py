@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_promo_codes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='regular_old_price',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Sale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('percent', 'Процент от цены'), ('fixed', 'Фиксированная сумма')], default='percent', max_length=10)),
+                ('value', models.PositiveIntegerField()),
+                ('rounding', models.PositiveSmallIntegerField(choices=[(1, 'Без округления'), (10, 'Вниз до десятков'), (100, 'Вниз до сотен'), (99, 'Вниз до …99')], default=1)),
+                ('available_only', models.BooleanField(default=False)),
+                ('product_ids', models.TextField(blank=True, help_text='id товаров через запятую; пусто — все подходящие')),
+                ('starts_at', models.DateTimeField(blank=True, help_text='Пусто — сразу', null=True)),
+                ('ends_at', models.DateTimeField(blank=True, help_text='Пусто — без окончания', null=True)),
+                ('status', models.PositiveSmallIntegerField(choices=[(10, 'Запланирована'), (20, 'Идёт'), (30, 'Завершена')], db_index=True, default=10)),
+                ('applied_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='store.category')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sale',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='store.sale'),
+        ),
+    ]
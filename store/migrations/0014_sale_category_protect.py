@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_popularity_decay'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='store.category'),
+        ),
+    ]
@@ -1,14 +1,71 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 
 class Category(models.Model):
+    PATH_SEGMENT = '{:08d}/'
+
     name = models.CharField(max_length=100)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='children'
+    )
+    # Материализованный путь от корня: "00000001/00000004/".
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ['path']
 
     def __str__(self):
         return self.name
 
+    def build_path(self):
+        if self.parent_id is None:
+            return self.PATH_SEGMENT.format(self.pk), 0
+        parent = Category.objects.only('path', 'depth').get(pk=self.parent_id)
+        return parent.path + self.PATH_SEGMENT.format(self.pk), parent.depth + 1
+
+    @property
+    def product_count(self):
+        from .catalog import subtree_product_counts
+        return subtree_product_counts().get(self.pk, 0)
+
+    def ancestor_ids(self):
+        return [int(segment) for segment in self.path.split('/')[:-2]]
+
+    def clean(self):
+        if self.pk and self.parent_id:
+            parent = Category.objects.only('path').get(pk=self.parent_id)
+            if parent.path.startswith(self.path):
+                raise ValidationError({'parent': 'Категория не может быть вложена сама в себя.'})
+
+    def save(self, *args, **kwargs):
+        # Сама категория и пути её потомков меняются вместе или не меняются вовсе;
+        # новая категория без пути тоже не должна остаться в базе.
+        with transaction.atomic():
+            if self.pk is None:
+                super().save(*args, **kwargs)
+                self.path, self.depth = self.build_path()
+                Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+                return
+
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+            self.path, self.depth = self.build_path()
+            if old_path and self.path.startswith(old_path) and self.path != old_path:
+                raise ValueError('Категория не может быть вложена сама в себя.')
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                from .catalog import move_subtree
+                move_subtree(old_path, self.path)
+
 
 class Product(models.Model):
     category = models.ForeignKey(
@@ -22,11 +79,49 @@ class Product(models.Model):
     old_price = models.IntegerField(blank=True, null=True)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     is_available = models.BooleanField(default=True)
+    # Скидка в процентах, вычисляется и хранится самой БД.
+    discount = models.GeneratedField(
+        expression=Case(
+            When(old_price__gt=F('price'), then=(F('old_price') - F('price')) * 100 / F('old_price')),
+            default=Value(0),
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    # Счётчики копятся в памяти процесса и сбрасываются пачкой (store.counters).
+    view_count = models.PositiveIntegerField(default=0)
+    purchase_count = models.PositiveIntegerField(default=0)
+    popularity = models.FloatField(default=0)
+    # Распродажа, которая сейчас снизила цену, и old_price до неё (store.pricing).
+    sale = models.ForeignKey(
+        'Sale',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='products'
+    )
+    regular_old_price = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['discount', 'id'], name='store_product_discount_idx'),
+            models.Index(fields=['price', 'id'], name='store_product_price_idx'),
+            models.Index(fields=['popularity', 'id'], name='store_product_popular_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class PopularityDecay(models.Model):
+    """Когда рейтинг популярности уменьшался в последний раз (одна строка)."""
+
+    decayed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Рейтинг уменьшен {self.decayed_at:%d.%m.%Y %H:%M}"
+
+
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
@@ -43,7 +138,37 @@ class CartItem(models.Model):
         return self.product.price * self.quantity
 
 
-class Order(models.Model):
+class InvalidStatusTransition(ValueError):
+    pass
+
+
+class AbstractOrder(models.Model):
+    """Общие поля рабочего заказа и его архивной копии."""
+
+    PROCESSING = 10
+    PAID = 20
+    SHIPPED = 30
+    DELIVERED = 40
+    CANCELLED = 50
+
+    STATUS_CHOICES = [
+        (PROCESSING, 'Обрабатывается'),
+        (PAID, 'Оплачено'),
+        (SHIPPED, 'Отправлен'),
+        (DELIVERED, 'Доставлен'),
+        (CANCELLED, 'Отменён'),
+    ]
+
+    # Допустимые переходы статусов; из конечных статусов переходов нет.
+    TRANSITIONS = {
+        PROCESSING: {PAID, SHIPPED, CANCELLED},
+        PAID: {SHIPPED, CANCELLED},
+        SHIPPED: {DELIVERED, CANCELLED},
+        DELIVERED: set(),
+        CANCELLED: set(),
+    }
+    TERMINAL_STATUSES = [DELIVERED, CANCELLED]
+
     DELIVERY_CHOICES = [
         ('pickup', 'Самовывоз'),
         ('delivery', 'Доставка'),
@@ -63,19 +188,66 @@ class Order(models.Model):
     delivery_type = models.CharField(max_length=20, choices=DELIVERY_CHOICES)
     payment_type = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='online')
     total_price = models.IntegerField(default=0)
-    status = models.CharField(max_length=50, default="Обрабатывается")
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=PROCESSING)
     admin_comment = models.TextField(blank=True)
     tracking_number = models.CharField(max_length=100, blank=True)
     promo_code = models.CharField(max_length=50, blank=True)
     discount_amount = models.IntegerField(default=0)
     comment = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+
+    is_archived = False
+
+    class Meta:
+        abstract = True
 
     def __str__(self):
         return f"Заказ #{self.id}"
 
 
+class Order(AbstractOrder):
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='store_order_status_updated'),
+        ]
+
+    def can_transition_to(self, status):
+        return status in self.TRANSITIONS[self.status]
+
+    def transition_to(self, status, changed_by=None):
+        """
+        Переводит заказ в новый статус.
+
+        UPDATE выполняется с условием WHERE status=<текущий>, поэтому из
+        двух одновременных переходов (например, отмена покупателем и
+        отправка администратором) применится только один. Второй получит
+        InvalidStatusTransition.
+        """
+        if not self.can_transition_to(status):
+            raise InvalidStatusTransition(
+                f"Нельзя перевести заказ из «{self.get_status_display()}» "
+                f"в «{dict(self.STATUS_CHOICES)[status]}»"
+            )
+        with transaction.atomic():
+            now = timezone.now()
+            updated = Order.objects.filter(pk=self.pk, status=self.status).update(
+                status=status, updated_at=now
+            )
+            if not updated:
+                raise InvalidStatusTransition("Статус заказа уже изменился")
+            OrderStatusHistory.objects.create(
+                order_id=self.pk,
+                from_status=self.status,
+                to_status=status,
+                changed_by=changed_by,
+            )
+            CustomerStats.record_transition(self, self.status, status)
+        self.status = status
+        self.updated_at = now
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -84,3 +256,231 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
+
+
+class OrderStatusHistory(models.Model):
+    """Журнал смены статусов. Только добавление; переживает архивацию заказа."""
+
+    order_id = models.BigIntegerField(db_index=True)
+    from_status = models.PositiveSmallIntegerField(choices=AbstractOrder.STATUS_CHOICES, null=True, blank=True)
+    to_status = models.PositiveSmallIntegerField(choices=AbstractOrder.STATUS_CHOICES)
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['changed_at', 'id']
+
+    def __str__(self):
+        return f"Заказ #{self.order_id}: {self.get_to_status_display()}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("История статусов не изменяется")
+        super().save(*args, **kwargs)
+
+
+class Sale(models.Model):
+    """
+    Переоценка группы товаров: сразу или по расписанию.
+
+    Применяется и отменяется пачками UPDATE в store.pricing; на время
+    распродажи прежняя цена хранится в old_price, а прежний old_price —
+    в regular_old_price, так что отмена возвращает цены точно.
+    """
+
+    PENDING = 10
+    ACTIVE = 20
+    FINISHED = 30
+    STATUS_CHOICES = [
+        (PENDING, 'Запланирована'),
+        (ACTIVE, 'Идёт'),
+        (FINISHED, 'Завершена'),
+    ]
+
+    PERCENT = 'percent'
+    FIXED = 'fixed'
+    KIND_CHOICES = [
+        (PERCENT, 'Процент от цены'),
+        (FIXED, 'Фиксированная сумма'),
+    ]
+
+    ROUND_NONE = 1
+    ROUND_10 = 10
+    ROUND_100 = 100
+    ROUND_99 = 99
+    ROUNDING_CHOICES = [
+        (ROUND_NONE, 'Без округления'),
+        (ROUND_10, 'Вниз до десятков'),
+        (ROUND_100, 'Вниз до сотен'),
+        (ROUND_99, 'Вниз до …99'),
+    ]
+
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=PERCENT)
+    value = models.PositiveIntegerField()
+    rounding = models.PositiveSmallIntegerField(choices=ROUNDING_CHOICES, default=ROUND_NONE)
+    # Без категории распродажа досталась бы всему каталогу, поэтому удалять её нельзя.
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, null=True, blank=True)
+    available_only = models.BooleanField(default=False)
+    product_ids = models.TextField(blank=True, help_text='id товаров через запятую; пусто — все подходящие')
+    starts_at = models.DateTimeField(null=True, blank=True, help_text='Пусто — сразу')
+    ends_at = models.DateTimeField(null=True, blank=True, help_text='Пусто — без окончания')
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    applied_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.kind == self.PERCENT and self.value is not None and not 0 < self.value < 100:
+            raise ValidationError({'value': 'Процент должен быть от 1 до 99.'})
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': 'Окончание должно быть позже начала.'})
+        try:
+            self.get_product_ids()
+        except ValueError:
+            raise ValidationError({'product_ids': 'Укажите числа через запятую.'})
+
+    def get_product_ids(self):
+        return [int(part) for part in self.product_ids.split(',') if part.strip()]
+
+
+class PromoCode(models.Model):
+    PERCENT = 'percent'
+    FIXED = 'fixed'
+    KIND_CHOICES = [
+        (PERCENT, 'Процент от суммы'),
+        (FIXED, 'Фиксированная сумма'),
+    ]
+
+    code = models.CharField(max_length=50, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=PERCENT)
+    value = models.PositiveIntegerField()
+    min_total = models.PositiveIntegerField(default=0)
+    # Пусто — скидка на всю корзину, иначе только на товары из этих категорий и их подкатегорий.
+    categories = models.ManyToManyField(Category, blank=True, related_name='promo_codes')
+    valid_from = models.DateTimeField(null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    usage_limit = models.PositiveIntegerField(null=True, blank=True)
+    per_user_limit = models.PositiveIntegerField(null=True, blank=True)
+    used_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.code
+
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+
+class PromoUsage(models.Model):
+    promo = models.ForeignKey(PromoCode, on_delete=models.CASCADE, related_name='usages')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    used_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['promo', 'user'], name='store_promousage_promo_user'),
+        ]
+
+
+class CustomerStats(models.Model):
+    """
+    Сводка по заказам покупателя для страницы профиля.
+
+    Обновляется F()-инкрементами в той же транзакции, что и заказ;
+    команда reconcile_customer_stats пересчитывает её с нуля.
+    Отменённые заказы учитываются в order_count, но не в lifetime_spend.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='order_stats'
+    )
+    order_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.BigIntegerField(default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Статистика {self.user_id}"
+
+    @classmethod
+    def record_order(cls, order):
+        if order.user_id is None:
+            return
+        cls.objects.get_or_create(user_id=order.user_id)
+        changes = {'order_count': F('order_count') + 1, 'last_order_at': order.created_at}
+        if order.status == AbstractOrder.CANCELLED:
+            changes['cancelled_count'] = F('cancelled_count') + 1
+        else:
+            changes['lifetime_spend'] = F('lifetime_spend') + order.total_price
+        cls.objects.filter(user_id=order.user_id).update(**changes)
+
+    @classmethod
+    def record_transition(cls, order, old_status, new_status):
+        if order.user_id is None or new_status != AbstractOrder.CANCELLED:
+            return
+        cls.objects.filter(user_id=order.user_id).update(
+            cancelled_count=F('cancelled_count') + 1,
+            lifetime_spend=F('lifetime_spend') - order.total_price,
+        )
+
+
+class ArchivedOrder(AbstractOrder):
+    """Завершённый заказ, перенесённый командой archive_orders. id совпадает с исходным."""
+
+    id = models.BigIntegerField(primary_key=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    is_archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='store_archorder_user_created'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    price = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.product.name} x {self.quantity}"
+
+
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='store_task_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id}"
@@ -0,0 +1,128 @@
+"""
+Массовая переоценка товаров (распродажи).
+
+Цены меняются пачками UPDATE ... SET price = <выражение от price>, без
+загрузки товаров в Python. После каждой пачки версия каталога
+повышается один раз — сигналы post_save при update() не срабатывают.
+Товар может участвовать только в одной распродаже одновременно.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, LessThanOrEqual
+from django.utils import timezone
+
+from .caching import bump_catalog_version
+from .catalog import subtree_q
+from .models import Product, Sale
+
+BATCH_SIZE = 500
+
+
+def sale_products(sale):
+    products = Product.objects.all()
+    if sale.category_id:
+        products = products.filter(subtree_q(sale.category, "category__path"))
+    if sale.available_only:
+        products = products.filter(is_available=True)
+    ids = sale.get_product_ids()
+    if ids:
+        products = products.filter(id__in=ids)
+    if sale.kind == Sale.FIXED:
+        # Скидка не может съесть всю цену — такие товары не участвуют.
+        products = products.filter(price__gt=sale.value)
+    return products
+
+
+def sale_price(sale):
+    """
+    SQL-выражение новой цены. Деление целых чисел в БД отбрасывает остаток.
+
+    Округление не применяется, если даёт цену не выше нуля или срезает
+    больше, чем сама скидка, — тогда остаётся неокруглённая цена.
+    """
+    price = F("price")
+    if sale.kind == Sale.PERCENT:
+        discounted = price - price * sale.value / 100
+    else:
+        discounted = price - sale.value
+    if sale.rounding == Sale.ROUND_NONE:
+        return discounted
+    if sale.rounding == Sale.ROUND_99:
+        rounded = (discounted + 1) / 100 * 100 - 1
+    else:
+        rounded = discounted / sale.rounding * sale.rounding
+    return Case(
+        When(
+            GreaterThan(rounded, 0) & LessThanOrEqual(discounted - rounded, price - discounted),
+            then=rounded,
+        ),
+        default=discounted,
+    )
+
+
+def chunks(ids, size):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def apply_sale(sale, batch_size=BATCH_SIZE):
+    """Снижает цены товаров распродажи. Возвращает число изменённых товаров."""
+    if not Sale.objects.filter(pk=sale.pk, status=Sale.PENDING).update(status=Sale.ACTIVE):
+        return 0
+    sale.status = Sale.ACTIVE
+
+    ids = list(sale_products(sale).filter(sale=None).order_by("id").values_list("id", flat=True))
+    total = 0
+    for chunk in chunks(ids, batch_size):
+        with transaction.atomic():
+            total += Product.objects.filter(id__in=chunk, sale=None).update(
+                sale=sale,
+                regular_old_price=F("old_price"),
+                old_price=F("price"),
+                price=sale_price(sale),
+            )
+        bump_catalog_version()
+
+    Sale.objects.filter(pk=sale.pk).update(applied_count=total)
+    sale.applied_count = total
+    return total
+
+
+def revert_sale(sale, batch_size=BATCH_SIZE):
+    """Возвращает прежние цены. Возвращает число изменённых товаров."""
+    if not Sale.objects.filter(pk=sale.pk, status__in=[Sale.PENDING, Sale.ACTIVE]).update(status=Sale.FINISHED):
+        return 0
+    sale.status = Sale.FINISHED
+
+    total = 0
+    while True:
+        chunk = list(Product.objects.filter(sale=sale).order_by("id").values_list("id", flat=True)[:batch_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            total += Product.objects.filter(id__in=chunk, sale=sale).update(
+                price=Coalesce(F("old_price"), F("price")),
+                old_price=F("regular_old_price"),
+                regular_old_price=None,
+                sale=None,
+            )
+        bump_catalog_version()
+    return total
+
+
+def process_due_sales(now=None, batch_size=BATCH_SIZE):
+    """Запускает наступившие и завершает истёкшие распродажи."""
+    now = now or timezone.now()
+    started = finished = 0
+
+    expired = Sale.objects.filter(status__in=[Sale.PENDING, Sale.ACTIVE], ends_at__lte=now)
+    for sale in expired:
+        revert_sale(sale, batch_size)
+        finished += 1
+
+    due = Sale.objects.filter(status=Sale.PENDING).filter(Q(starts_at=None) | Q(starts_at__lte=now))
+    for sale in due.select_related("category"):
+        apply_sale(sale, batch_size)
+        started += 1
+    return started, finished
@@ -0,0 +1,122 @@
+"""
+Промокоды.
+
+Активные правила кэшируются в памяти процесса на PROMO_RULES_TIMEOUT
+секунд, поэтому проверка кода при оформлении заказа не ходит в базу.
+Лимиты использований кэшу не доверяют: redeem() списывает использование
+условным UPDATE ... WHERE used_count < usage_limit, и при одновременных
+заказах код не будет использован больше разрешённого.
+"""
+import threading
+import time
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .catalog import subtree_q
+from .models import Category, PromoCode, PromoUsage
+
+_lock = threading.Lock()
+_rules = None
+_loaded_at = 0.0
+
+
+class PromoError(Exception):
+    pass
+
+
+def load_rules():
+    now = timezone.now()
+    promos = (
+        PromoCode.objects.filter(is_active=True)
+        .filter(Q(valid_until=None) | Q(valid_until__gt=now))
+        .exclude(usage_limit__isnull=False, used_count__gte=F("usage_limit"))
+        .prefetch_related("categories")
+    )
+    rules = {}
+    for promo in promos:
+        categories = list(promo.categories.all())
+        promo.category_ids = None
+        if categories:
+            subtrees = reduce(or_, [subtree_q(c) for c in categories])
+            promo.category_ids = set(Category.objects.filter(subtrees).values_list("id", flat=True))
+        rules[promo.code] = promo
+    return rules
+
+
+def active_rules():
+    global _rules, _loaded_at
+    with _lock:
+        if _rules is not None and time.monotonic() - _loaded_at < settings.PROMO_RULES_TIMEOUT:
+            return _rules
+    rules = load_rules()
+    with _lock:
+        _rules, _loaded_at = rules, time.monotonic()
+    return rules
+
+
+def invalidate():
+    global _rules
+    with _lock:
+        _rules = None
+
+
+def apply_promo(code, products):
+    """
+    Проверяет промокод для корзины и считает скидку.
+
+    products — товары корзины с атрибутами quantity и total_price,
+    как их собирает checkout(). Возвращает (promo, discount).
+    """
+    promo = active_rules().get(code.strip().upper())
+    now = timezone.now()
+    if (
+        promo is None
+        or (promo.valid_from and promo.valid_from > now)
+        or (promo.valid_until and promo.valid_until <= now)
+    ):
+        raise PromoError("Промокод не найден или больше не действует")
+
+    total = sum(p.total_price for p in products)
+    if total < promo.min_total:
+        raise PromoError(f"Промокод действует для заказов от {promo.min_total} ₸")
+
+    eligible = sum(
+        p.total_price for p in products
+        if promo.category_ids is None or p.category_id in promo.category_ids
+    )
+    if not eligible:
+        raise PromoError("Промокод не действует на товары в корзине")
+
+    if promo.kind == PromoCode.PERCENT:
+        discount = eligible * min(promo.value, 100) // 100
+    else:
+        discount = min(promo.value, eligible)
+    return promo, discount
+
+
+def redeem(promo, user):
+    """
+    Списывает одно использование промокода.
+
+    Вызывается внутри транзакции оформления заказа: если заказ не
+    сохранится, списание откатится вместе с ним.
+    """
+    updated = (
+        PromoCode.objects.filter(pk=promo.pk, is_active=True)
+        .filter(Q(usage_limit=None) | Q(used_count__lt=F("usage_limit")))
+        .update(used_count=F("used_count") + 1)
+    )
+    if not updated:
+        raise PromoError("Лимит использований промокода исчерпан")
+
+    if promo.per_user_limit is not None:
+        usage, _ = PromoUsage.objects.get_or_create(promo_id=promo.pk, user=user)
+        updated = PromoUsage.objects.filter(
+            pk=usage.pk, used_count__lt=promo.per_user_limit
+        ).update(used_count=F("used_count") + 1)
+        if not updated:
+            raise PromoError("Вы уже использовали этот промокод максимальное число раз")
@@ -0,0 +1,155 @@
+"""
+Простая очередь фоновых задач поверх таблицы Task.
+
+Задачи регистрируются декоратором @task и ставятся в очередь через
+enqueue()/.delay(). Команда run_worker забирает готовые задачи пачками
+и выполняет их в пуле потоков. Внешний брокер не нужен: очередь живёт
+в той же базе данных, что и магазин.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+FINISH_ATTEMPTS = 3
+FINISH_RETRY_DELAY = 0.5
+
+
+def task(func=None, *, name=None, max_attempts=5):
+    def decorator(func):
+        task_name = name or func.__name__
+        func.task_name = task_name
+        func.max_attempts = max_attempts
+        func.delay = lambda **kwargs: enqueue(task_name, **kwargs)
+        registry[task_name] = func
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(name, run_at=None, **kwargs):
+    """Ставит задачу в очередь после фиксации текущей транзакции."""
+    func = registry[name]
+    transaction.on_commit(lambda: Task.objects.create(
+        name=name,
+        payload=kwargs,
+        max_attempts=func.max_attempts,
+        run_at=run_at or timezone.now(),
+    ))
+
+
+def backoff(attempts):
+    base = getattr(settings, "TASK_RETRY_BACKOFF", 30)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def claim(batch_size, worker_id=None):
+    """
+    Забирает до batch_size готовых задач.
+
+    Захват делается условным UPDATE ... WHERE status='pending', поэтому
+    одну строку может получить только один воркер, даже если несколько
+    воркеров выбрали одни и те же id. Задачи, зависшие в статусе running
+    дольше TASK_LOCK_TIMEOUT (например, после падения воркера), снова
+    становятся доступными, если у них остались попытки, иначе помечаются
+    как failed.
+    """
+    now = timezone.now()
+    token = worker_id or uuid.uuid4().hex
+    stale = now - timedelta(seconds=getattr(settings, "TASK_LOCK_TIMEOUT", 600))
+
+    # Задача, которая роняет воркер, не должна возвращаться в очередь бесконечно.
+    stuck = Task.objects.filter(status="running", locked_at__lt=stale)
+    stuck.filter(attempts__gte=F("max_attempts")).update(
+        status="failed", locked_by="", last_error="Превышено время блокировки: воркер не завершил задачу"
+    )
+    stuck.filter(attempts__lt=F("max_attempts")).update(status="pending", locked_by="")
+
+    candidates = list(
+        Task.objects.filter(status="pending", run_at__lte=now)
+        .order_by("run_at", "id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+
+    Task.objects.filter(id__in=candidates, status="pending").update(
+        status="running",
+        locked_by=token,
+        locked_at=now,
+        attempts=F("attempts") + 1,
+    )
+    return list(Task.objects.filter(id__in=candidates, status="running", locked_by=token))
+
+
+def finish(task_obj, **fields):
+    """
+    Записывает итог выполнения задачи.
+
+    Задача уже выполнена, поэтому короткий сбой БД (например, «database is
+    locked») не должен оставить её в статусе running — иначе после
+    TASK_LOCK_TIMEOUT её выполнил бы ещё раз другой воркер.
+    """
+    for attempt in range(1, FINISH_ATTEMPTS + 1):
+        try:
+            Task.objects.filter(id=task_obj.id, locked_by=task_obj.locked_by).update(**fields)
+            return True
+        except DatabaseError:
+            if attempt == FINISH_ATTEMPTS:
+                logger.exception("Не удалось записать статус задачи %s", task_obj)
+                return False
+            time.sleep(FINISH_RETRY_DELAY * attempt)
+
+
+def execute(task_obj):
+    try:
+        func = registry[task_obj.name]
+        func(**task_obj.payload)
+    except Exception as exc:
+        logger.exception("Задача %s завершилась с ошибкой", task_obj)
+        fields = {"last_error": f"{type(exc).__name__}: {exc}", "locked_by": ""}
+        if task_obj.attempts < task_obj.max_attempts:
+            fields.update(status="pending", run_at=timezone.now() + backoff(task_obj.attempts))
+        else:
+            fields.update(status="failed")
+        finish(task_obj, **fields)
+        return False
+
+    finish(task_obj, status="done", last_error="", locked_by="")
+    return True
+
+
+def execute_in_thread(task_obj):
+    try:
+        return execute(task_obj)
+    finally:
+        # У каждого потока пула своё соединение с БД.
+        connection.close()
+
+
+def run_batch(batch_size=20, threads=4, worker_id=None):
+    """Забирает одну пачку задач и выполняет её. Возвращает число задач."""
+    tasks = claim(batch_size, worker_id)
+    if not tasks:
+        return 0
+    if threads <= 1 or len(tasks) == 1:
+        for task_obj in tasks:
+            execute(task_obj)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(execute_in_thread, tasks))
+    return len(tasks)
@@ -0,0 +1,106 @@
+"""
+Ограничение частоты запросов поверх кэша Django.
+
+Используется скользящее окно: счётчики текущего и предыдущего окна
+лежат в кэше, а предыдущее учитывается пропорционально тому, какая его
+часть ещё попадает в последние period секунд. Проверка — один
+get_many, пропущенный запрос добавляет один incr. Отклонённые запросы
+не считаются, поэтому клиент, переставший спешить, сразу получает доступ.
+"""
+import hashlib
+import math
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Разбирает "30/m" в (30, 60)."""
+    count, _, unit = rate.partition("/")
+    return int(count), PERIODS[unit]
+
+
+def client_id(request):
+    # Без cookie сессии пользователь заведомо анонимный — сессию не читаем.
+    user = getattr(request, "user", None)
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def hit(key, limit, period, now=None):
+    """
+    Учитывает запрос. Возвращает 0, если он разрешён, иначе число
+    секунд, через которое стоит повторить.
+    """
+    now = time.time() if now is None else now
+    window = int(now // period)
+    current_key = f"ratelimit:{key}:{window}"
+    previous_key = f"ratelimit:{key}:{window - 1}"
+
+    counts = cache.get_many([current_key, previous_key])
+    current = counts.get(current_key, 0)
+    previous = counts.get(previous_key, 0)
+    elapsed = (now % period) / period
+
+    if previous * (1 - elapsed) + current >= limit:
+        if current < limit and previous:
+            # Момент, когда вклад предыдущего окна упадёт ниже остатка лимита.
+            free_at = 1 - (limit - current) / previous
+            return max(1, math.ceil((free_at - elapsed) * period))
+        return max(1, math.ceil(period - now % period))
+
+    try:
+        cache.incr(current_key)
+    except ValueError:
+        if not cache.add(current_key, 1, period * 2):
+            cache.incr(current_key)
+    return 0
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        "Слишком много запросов. Повторите позже.",
+        status=429,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def check(request, scope, rate, field=None):
+    """
+    Возвращает ответ 429 или None, если запрос укладывается в лимит.
+
+    Если задано field, лимит отдельно считается и по значению этого поля
+    POST (например, по логину): подбор пароля к одному аккаунту с разных
+    адресов упирается в тот же лимит.
+    """
+    limit, period = parse_rate(rate)
+    keys = [f"{scope}:{client_id(request)}"]
+    value = request.POST.get(field, "").strip().lower() if field else ""
+    if value:
+        keys.append(f"{scope}:{field}:{hashlib.md5(value.encode()).hexdigest()}")
+    for key in keys:
+        retry_after = hit(key, limit, period)
+        if retry_after:
+            return too_many_requests(retry_after)
+    return None
+
+
+def ratelimit(rate, scope=None):
+    """Декоратор view: @ratelimit("10/m")."""
+    def decorator(view):
+        name = scope or view.__name__
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return check(request, name, rate) or view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from . import promo
+from .caching import bump_catalog_version
+from .models import Category, CustomerStats, Order, Product, PromoCode
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    # До коммита другой запрос успел бы закэшировать старые данные под новой версией.
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Order)
+def count_new_order(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CustomerStats.record_order(instance)
+
+
+# Другие процессы увидят изменения не позже чем через PROMO_RULES_TIMEOUT.
+@receiver([post_save, post_delete], sender=PromoCode)
+@receiver(m2m_changed, sender=PromoCode.categories.through)
+def invalidate_promo_rules(sender, **kwargs):
+    promo.invalidate()
@@ -0,0 +1,40 @@
+"""
+Хранилище медиафайлов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого, поэтому одинаковые фото разных
+товаров лежат на диске один раз, а URL файла никогда не меняется и его
+можно кэшировать в браузере бессрочно.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+HASHED_PREFIX = "hashed/"
+CHUNK_SIZE = 64 * 1024
+
+
+def is_hashed(name):
+    return bool(name) and name.startswith(HASHED_PREFIX)
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        value = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        return f"{HASHED_PREFIX}{value[:2]}/{value[2:4]}/{value}{ext}"
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        # Пишем во временный файл и атомарно переименовываем: читатели не
+        # увидят недописанный файл, а гонка двух загрузок одного фото безвредна.
+        tmp_name = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
@@ -0,0 +1,95 @@
+"""
+Фоновые задачи магазина. Выполняются командой run_worker.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import send_mail
+from PIL import Image
+
+from .caching import bump_catalog_version
+from .models import Order, Product
+from .queue import task
+
+
+def order_recipient(order):
+    if order.email:
+        return order.email
+    if order.user:
+        return order.user.email
+    return ""
+
+
+def notify(order, subject, message):
+    recipient = order_recipient(order)
+    if recipient:
+        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient])
+
+
+@task
+def send_order_confirmation(order_id):
+    order = Order.objects.select_related("user").get(pk=order_id)
+    notify(
+        order,
+        f"SalePoint: заказ № {order.id} оформлен",
+        f"Спасибо за покупку! Сумма заказа: {order.total_price} ₸.",
+    )
+
+
+@task
+def send_payment_confirmation(order_id):
+    order = Order.objects.select_related("user").get(pk=order_id)
+    notify(
+        order,
+        f"SalePoint: заказ № {order.id} оплачен",
+        f"Оплата на сумму {order.total_price} ₸ получена.",
+    )
+
+
+@task
+def send_status_notification(order_id):
+    order = Order.objects.select_related("user").get(pk=order_id)
+    message = f"Новый статус заказа: {order.get_status_display()}."
+    if order.tracking_number:
+        message += f"\nТрек-номер: {order.tracking_number}"
+    notify(order, f"SalePoint: заказ № {order.id}", message)
+
+
+@task
+def assign_tracking_number(order_id):
+    from .views import generate_tracking_code
+
+    # Условный UPDATE не перезапишет номер, если его уже выставили вручную.
+    updated = Order.objects.filter(pk=order_id, tracking_number="").update(
+        tracking_number=generate_tracking_code()
+    )
+    if updated:
+        send_status_notification.delay(order_id=order_id)
+
+
+@task
+def optimize_product_image(product_id):
+    product = Product.objects.get(pk=product_id)
+    if not product.image:
+        return
+
+    max_size = getattr(settings, "PRODUCT_IMAGE_MAX_SIZE", 1200)
+    with product.image.open("rb") as f:
+        image = Image.open(f)
+        image.load()
+    if max(image.size) <= max_size:
+        return
+
+    image_format = image.format or "JPEG"
+    image.thumbnail((max_size, max_size))
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, optimize=True)
+
+    # Исходный файл не удаляем: тот же файл может быть у других товаров.
+    storage = product.image.storage
+    name = product.image.name
+    new_name = storage.save(name, ContentFile(buffer.getvalue()))
+    if new_name != name:
+        Product.objects.filter(pk=product_id).update(image=new_name)
+    bump_catalog_version()
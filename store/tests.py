@@ -1,12 +1,51 @@
-from django.test import TestCase, Client
-from django.urls import reverse, NoReverseMatch
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, ProtectedError
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import (
+    Client, LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, resolve, reverse
+from django.utils import timezone
 
-from store.models import Product, Category, Order, OrderItem
+from store import archive, counters, promo, queue, ratelimit
+from store.api import encode_cursor
+from store.archive import archivable_orders
+from store.caching import get_catalog_version, get_popularity_version
+from store.catalog import breadcrumbs, filter_products, subtree_products
+from store.middleware import AnonymousPageCacheMiddleware
+from store.models import (
+    ArchivedOrder, ArchivedOrderItem, Category, CustomerStats, InvalidStatusTransition, Order, OrderItem,
+    OrderStatusHistory, PopularityDecay, Product, PromoCode, Sale, Task,
+)
+from store.pricing import apply_sale, process_due_sales, revert_sale
+from store.tasks import assign_tracking_number, send_order_confirmation
+from store.views import media
 
 
 class BaseTest(TestCase):
     def setUp(self):
+        cache.clear()
+        counters.discard()
+        self.addCleanup(counters.discard)
+        promo.invalidate()
         self.client = Client()
 
         self.user = User.objects.create_user(
@@ -94,16 +133,18 @@ class CheckoutTests(BaseTest):
             {"quantity": 2}
         )
 
-        response = self.client.post(reverse("checkout"), {
-            "phone": "7777777",
-            "delivery_type": "delivery",
-            "address": "Almaty"
-        })
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("checkout"), {
+                "phone": "7777777",
+                "delivery_type": "delivery",
+                "address": "Almaty"
+            })
 
         order = Order.objects.first()
         self.assertIsNotNone(order)
         self.assertEqual(order.total_price, 2000)
-        self.assertEqual(order.status, "Обрабатывается")
+        self.assertEqual(order.status, Order.PROCESSING)
+        self.assertTrue(Task.objects.filter(name="send_order_confirmation").exists())
 
 
 class OrderTests(BaseTest):
@@ -116,7 +157,7 @@ class OrderTests(BaseTest):
             phone="777",
             delivery_type="delivery",
             total_price=2000,
-            status="Обрабатывается"
+            status=Order.PROCESSING
         )
 
         OrderItem.objects.create(
@@ -139,18 +180,91 @@ class OrderTests(BaseTest):
         )
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "2000")
+        self.assertEqual(response.context["items"][0].line_total, 2000)
 
     def test_cancel_order(self):
         self.client.login(username="testuser", password="1234")
         self.client.post(reverse("cancel_order", args=[self.order.id]))
         self.order.refresh_from_db()
-        self.assertEqual(self.order.status, "Отменён")
+        self.assertEqual(self.order.status, Order.CANCELLED)
 
     def test_payment(self):
         self.client.login(username="testuser", password="1234")
         self.client.post(reverse("payment", args=[self.order.id]))
         self.order.refresh_from_db()
-        self.assertEqual(self.order.status, "Оплачено")
+        self.assertEqual(self.order.status, Order.PAID)
+
+    def test_cancelled_order_cannot_be_paid(self):
+        self.client.login(username="testuser", password="1234")
+        self.client.post(reverse("cancel_order", args=[self.order.id]))
+        response = self.client.post(reverse("payment", args=[self.order.id]))
+        self.assertRedirects(response, reverse("order_detail", args=[self.order.id]))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.CANCELLED)
+
+
+class OrderStatusTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(user=self.user, phone="777", delivery_type="pickup")
+
+    def test_transition_writes_history(self):
+        self.order.transition_to(Order.PAID, changed_by=self.user)
+        self.order.transition_to(Order.SHIPPED)
+
+        history = list(OrderStatusHistory.objects.filter(order_id=self.order.id).values_list("from_status", "to_status"))
+        self.assertEqual(history, [(Order.PROCESSING, Order.PAID), (Order.PAID, Order.SHIPPED)])
+
+    def test_invalid_transition(self):
+        self.order.transition_to(Order.CANCELLED)
+        with self.assertRaises(InvalidStatusTransition):
+            self.order.transition_to(Order.PAID)
+
+    def test_concurrent_transition_loses(self):
+        admin_copy = Order.objects.get(pk=self.order.pk)
+        self.order.transition_to(Order.CANCELLED)
+
+        with self.assertRaises(InvalidStatusTransition):
+            admin_copy.transition_to(Order.SHIPPED)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, Order.CANCELLED)
+        self.assertEqual(OrderStatusHistory.objects.count(), 1)
+
+    def test_history_is_append_only(self):
+        self.order.transition_to(Order.PAID)
+        entry = OrderStatusHistory.objects.get()
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_admin_rejects_invalid_transition(self):
+        admin_user = User.objects.create_superuser(username="admin", password="1234")
+        self.client.force_login(admin_user)
+        self.order.transition_to(Order.CANCELLED)
+        url = reverse("admin:store_order_change", args=[self.order.id])
+        data = {
+            "phone": "777", "delivery_type": "pickup", "payment_type": "online",
+            "total_price": 0, "status": Order.SHIPPED, "discount_amount": 0,
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "можно перейти только в")
+
+    def test_admin_transition(self):
+        admin_user = User.objects.create_superuser(username="admin", password="1234")
+        self.client.force_login(admin_user)
+        url = reverse("admin:store_order_change", args=[self.order.id])
+        data = {
+            "phone": "888", "delivery_type": "pickup", "payment_type": "online",
+            "total_price": 0, "status": Order.SHIPPED, "discount_amount": 0,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.SHIPPED)
+        self.assertEqual(self.order.phone, "888")
+        self.assertEqual(OrderStatusHistory.objects.get().changed_by, admin_user)
+        self.assertTrue(Task.objects.filter(name="assign_tracking_number").exists())
 
 
 class CategoryTests(BaseTest):
@@ -164,6 +278,1143 @@ class CategoryTests(BaseTest):
         self.assertContains(response, "Samsung S25")
 
 
+class DealsTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.bulk_create([
+            Product(
+                category=self.category,
+                name=f"Товар {i}",
+                description="",
+                price=1000 - i % 500,
+                old_price=1000 if i % 3 else None,
+            )
+            for i in range(3000)
+        ])
+
+    def test_discount_is_computed_by_db(self):
+        product = Product.objects.create(
+            category=self.category, name="Pixel", description="", price=750, old_price=1000
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.discount, 25)
+        self.assertEqual(Product.objects.get(pk=self.product1.pk).discount, 0)
+
+    def test_deals_sorted_by_discount(self):
+        response = self.client.get(reverse("deals"))
+        self.assertEqual(response.status_code, 200)
+        discounts = [p.discount for p in response.context["page_obj"]]
+        self.assertEqual(discounts, sorted(discounts, reverse=True))
+        self.assertEqual(discounts[0], 49)
+        self.assertEqual(
+            response.context["page_obj"].paginator.count,
+            Product.objects.exclude(old_price=None).filter(price__lte=990).count(),
+        )
+
+    def test_home_sort_by_discount(self):
+        response = self.client.get(reverse("home"), {"sort": "discount"})
+        discounts = [p.discount for p in response.context["page_obj"]]
+        self.assertEqual(discounts, [49] * len(discounts))
+
+    def test_deals_query_uses_index(self):
+        plan = Product.objects.filter(discount__gt=0).order_by("-discount", "-id").explain()
+        self.assertIn("store_product_discount_idx", plan)
+
+
+class FragmentCacheTests(BaseTest):
+
+    def test_category_strip_invalidated_on_catalog_change(self):
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "2 товаров")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                category=self.category,
+                name="Pixel 9",
+                description="Test Pixel",
+                price=900,
+            )
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "3 товаров")
+
+    def test_product_card_shows_new_price(self):
+        self.client.get(reverse("home"))
+        self.product1.price = 777
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product1.save()
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "777 ₸")
+
+    def test_catalog_version_bumped_only_after_commit(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.product1.price = 777
+                self.product1.save()
+                self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(get_catalog_version(), version + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.product1.save()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(get_catalog_version(), version + 1)
+
+    def test_cached_fragments_skip_category_query(self):
+        self.client.login(username="testuser", password="1234")
+        self.client.get(reverse("home"))
+        # Сессия, пользователь, количество и страница товаров — без категорий.
+        with self.assertNumQueries(4):
+            self.client.get(reverse("home"))
+
+    def test_bench_templates_command(self):
+        out = StringIO()
+        call_command("bench_templates", "store/home.html", iterations=3, stdout=out)
+        self.assertIn("store/home.html", out.getvalue())
+
+
+@queue.task(max_attempts=2)
+def failing_task():
+    raise RuntimeError("boom")
+
+
+class TaskQueueTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.user.email = "test@example.com"
+        self.user.save()
+        self.order = Order.objects.create(
+            user=self.user,
+            phone="777",
+            delivery_type="delivery",
+            total_price=2000,
+        )
+
+    def enqueue(self, func, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            func.delay(**kwargs)
+
+    def test_worker_sends_notification(self):
+        self.enqueue(send_order_confirmation, order_id=self.order.id)
+
+        self.assertEqual(queue.run_batch(threads=1), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Task.objects.get().status, "done")
+
+    def test_claimed_task_not_claimed_twice(self):
+        self.enqueue(assign_tracking_number, order_id=self.order.id)
+
+        self.assertEqual(len(queue.claim(10, "worker-1")), 1)
+        self.assertEqual(queue.claim(10, "worker-2"), [])
+
+    def test_retry_with_backoff_then_fail(self):
+        self.enqueue(failing_task)
+
+        with self.assertLogs("store.queue", "ERROR"):
+            queue.run_batch(threads=1)
+        task = Task.objects.get()
+        self.assertEqual(task.status, "pending")
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn("boom", task.last_error)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs("store.queue", "ERROR"):
+            queue.run_batch(threads=1)
+        self.assertEqual(Task.objects.get().status, "failed")
+
+    def flaky_update(self, failures):
+        original = QuerySet.update
+        calls = []
+
+        def update(qs, **kwargs):
+            if qs.model is Task and "status" in kwargs:
+                calls.append(kwargs)
+                if len(calls) <= failures:
+                    raise OperationalError("database is locked")
+            return original(qs, **kwargs)
+        return mock.patch.object(QuerySet, "update", update)
+
+    @mock.patch.object(queue, "FINISH_RETRY_DELAY", 0)
+    def test_final_status_update_retried(self):
+        self.enqueue(assign_tracking_number, order_id=self.order.id)
+        task = queue.claim(10, "worker")[0]
+        with self.flaky_update(failures=2):
+            self.assertTrue(queue.execute(task))
+        self.assertEqual(Task.objects.get().status, "done")
+
+    @mock.patch.object(queue, "FINISH_RETRY_DELAY", 0)
+    def test_final_status_update_failure_logged(self):
+        self.enqueue(assign_tracking_number, order_id=self.order.id)
+        task = queue.claim(10, "worker")[0]
+        with self.flaky_update(failures=queue.FINISH_ATTEMPTS), self.assertLogs("store.queue", "ERROR"):
+            self.assertTrue(queue.execute(task))
+        self.assertEqual(Task.objects.get().status, "running")
+
+    def test_stale_task_requeued_until_attempts_exhausted(self):
+        self.enqueue(assign_tracking_number, order_id=self.order.id)
+        stale = timezone.now() - timedelta(hours=1)
+
+        queue.claim(10, "crashed-1")
+        Task.objects.update(locked_at=stale)
+        self.assertEqual(len(queue.claim(10, "crashed-2")), 1)
+
+        Task.objects.update(locked_at=stale, attempts=F("max_attempts"))
+        self.assertEqual(queue.claim(10, "worker"), [])
+        task = Task.objects.get()
+        self.assertEqual(task.status, "failed")
+        self.assertEqual(task.locked_by, "")
+
+    def test_assign_tracking_number(self):
+        self.enqueue(assign_tracking_number, order_id=self.order.id)
+        call_command("run_worker", once=True, threads=1, stdout=StringIO())
+
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.tracking_number.startswith("SP"))
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoadTestCommandTests(LiveServerTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(counters.discard)
+        User.objects.create_user(username="loaduser", password="1234")
+        category = Category.objects.create(name="Смартфоны")
+        Product.objects.create(category=category, name="iPhone 15", description="Test", price=1000)
+
+    def run_loadtest(self):
+        out = StringIO()
+        call_command(
+            "loadtest",
+            base_url=self.live_server_url,
+            rate=20,
+            duration=0.3,
+            # Живой сервер в тестах делит одно соединение SQLite между потоками,
+            # и параллельные транзакции сбивают его состояние.
+            concurrency=1,
+            think_time=0,
+            checkout_ratio=1,
+            username="loaduser",
+            password="1234",
+            seed=1,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_full_journey_report(self):
+        report = self.run_loadtest()
+        for step in ["search", "product_detail", "add_to_cart", "cart", "login", "checkout"]:
+            self.assertIn(step, report)
+        self.assertNotIn("(429)", report)
+        self.assertTrue(Order.objects.exists())
+
+    @override_settings(RATE_LIMITS={"add_to_cart": "1/m"})
+    def test_throttled_requests_reported_separately(self):
+        report = self.run_loadtest()
+        row = next(line for line in report.splitlines() if line.startswith("add_to_cart"))
+        error_rate, throttled_rate = map(float, row.split()[-2:])
+        self.assertEqual(error_rate, 0)
+        self.assertGreater(throttled_rate, 0)
+        self.assertIn("(429)", report)
+
+
+class PageCacheTests(BaseTest):
+
+    def test_anonymous_page_served_from_cache(self):
+        first = self.client.get(reverse("home"))
+        self.assertEqual(first["X-Page-Cache"], "MISS")
+
+        client = Client()
+        with self.assertNumQueries(0):
+            second = client.get(reverse("home"))
+        self.assertEqual(second["X-Page-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+        self.assertNotIn("csrftoken", first.cookies)
+        self.assertNotIn("csrftoken", second.cookies)
+        self.assertNotContains(second, 'name="csrfmiddlewaretoken" value=')
+        self.assertIn("public", second["Cache-Control"])
+        self.assertIn("Cookie", second["Vary"])
+
+    def test_query_string_is_part_of_key(self):
+        self.client.get(reverse("home"))
+        response = self.client.get(reverse("home"), {"q": "iPhone"})
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertNotContains(response, "Samsung S25")
+
+    def test_only_known_params_are_part_of_key(self):
+        self.client.get(reverse("home"), {"sort": "price_asc", "q": "i"})
+        response = self.client.get(reverse("home"), {"q": "i", "utm_source": "ads", "sort": "price_asc"})
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+
+    def test_response_with_cookie_or_csrf_not_cached(self):
+        def sets_cookie(request):
+            response = HttpResponse("page")
+            response.set_cookie("promo", "1")
+            return response
+
+        def uses_csrf(request):
+            return HttpResponse(get_token(request))
+
+        for view in (sets_cookie, uses_csrf):
+            with self.subTest(view=view.__name__):
+                cache.clear()
+                middleware = AnonymousPageCacheMiddleware(
+                    lambda request: middleware.process_view(request, view, (), {}) or view(request)
+                )
+                for _ in range(2):
+                    request = RequestFactory().get(reverse("home"))
+                    request.resolver_match = resolve(reverse("home"))
+                    response = middleware(request)
+                    self.assertNotIn("X-Page-Cache", response)
+                    self.assertIn("private", response["Cache-Control"])
+
+    def test_uncached_pages_keep_csrf_token(self):
+        self.client.login(username="testuser", password="1234")
+        response = self.client.get(reverse("product_detail", args=[self.product1.id]))
+        self.assertContains(response, 'name="csrfmiddlewaretoken" value=')
+
+    def test_catalog_change_purges_pages(self):
+        self.client.get(reverse("product_detail", args=[self.product1.id]))
+        self.product1.name = "iPhone 16"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product1.save()
+        response = self.client.get(reverse("product_detail", args=[self.product1.id]))
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertContains(response, "iPhone 16")
+
+    def test_visitor_with_cart_not_cached(self):
+        self.client.get(reverse("home"))
+        self.client.post(reverse("add_to_cart", args=[self.product1.id]))
+        response = self.client.get(reverse("home"))
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_authenticated_user_not_cached(self):
+        self.client.login(username="testuser", password="1234")
+        self.client.get(reverse("home"))
+        response = self.client.get(reverse("home"))
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "Выход")
+
+    def test_cart_status(self):
+        response = self.client.get(reverse("cart_status"))
+        self.assertEqual(response.json()["count"], 0)
+        self.assertTrue(response.json()["csrf_token"])
+        self.assertIn("csrftoken", response.cookies)
+
+        self.client.post(reverse("add_to_cart", args=[self.product1.id]))
+        self.client.post(reverse("add_to_cart", args=[self.product2.id]))
+        self.assertEqual(self.client.get(reverse("cart_status")).json()["count"], 2)
+
+    def test_token_from_cart_status_passes_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.get(reverse("product_detail", args=[self.product1.id]))
+        token = client.get(reverse("cart_status")).json()["csrf_token"]
+        response = client.post(
+            reverse("add_to_cart", args=[self.product1.id]), {"csrfmiddlewaretoken": token}
+        )
+        self.assertEqual(response.status_code, 302)
+
+
+class CategoryTreeTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.electronics = Category.objects.create(name="Электроника")
+        self.phones = Category.objects.create(name="Телефоны", parent=self.electronics)
+        self.android = Category.objects.create(name="Android", parent=self.phones)
+        self.audio = Category.objects.create(name="Аудио", parent=self.electronics)
+        self.pixel = Product.objects.create(
+            category=self.android, name="Pixel 9", description="", price=900
+        )
+        Product.objects.create(category=self.audio, name="Sony WH-1000", description="", price=300)
+
+    def test_paths(self):
+        self.android.refresh_from_db()
+        self.assertEqual(self.android.depth, 2)
+        self.assertEqual(
+            self.android.path,
+            f"{self.electronics.id:08d}/{self.phones.id:08d}/{self.android.id:08d}/",
+        )
+
+    def test_subtree_listing_single_query(self):
+        with self.assertNumQueries(1):
+            names = sorted(p.name for p in subtree_products(self.electronics))
+        self.assertEqual(names, ["Pixel 9", "Sony WH-1000"])
+        self.assertEqual([p.name for p in subtree_products(self.android)], ["Pixel 9"])
+
+    def test_category_detail_lists_subtree(self):
+        response = self.client.get(reverse("category_detail", args=[self.electronics.id]))
+        self.assertContains(response, "Pixel 9")
+        self.assertContains(response, "Sony WH-1000")
+        self.assertContains(response, "2 товаров")
+
+    def test_breadcrumbs_cached(self):
+        self.assertEqual([c["name"] for c in breadcrumbs(self.android)], ["Электроника", "Телефоны"])
+        with self.assertNumQueries(0):
+            breadcrumbs(self.android)
+
+    def test_subtree_counts(self):
+        self.assertEqual(self.electronics.product_count, 2)
+        self.assertEqual(self.phones.product_count, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.audio.product_count, 1)
+
+    def test_move_subtree_is_bulk_update(self):
+        self.phones.parent = self.audio
+        # SAVEPOINT, SELECT старого пути, SELECT родителя, UPDATE узла,
+        # UPDATE потомков, RELEASE SAVEPOINT.
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(6):
+            self.phones.save()
+        # Версия каталога повышается только после коммита.
+        self.assertEqual(get_catalog_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_catalog_version(), version)
+
+        self.android.refresh_from_db()
+        self.assertEqual(self.android.depth, 3)
+        self.assertTrue(self.android.path.startswith(self.audio.path))
+        self.assertEqual(self.audio.product_count, 2)
+        self.assertEqual(self.electronics.product_count, 2)
+
+    def test_failed_move_rolls_back_node(self):
+        old_path = Category.objects.get(pk=self.phones.pk).path
+        self.phones.parent = self.audio
+        with mock.patch("store.catalog.move_subtree", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.phones.save()
+
+        phones = Category.objects.get(pk=self.phones.pk)
+        self.assertEqual((phones.parent_id, phones.path), (self.electronics.id, old_path))
+
+    def test_failed_create_leaves_no_category(self):
+        with mock.patch.object(Category, "build_path", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Category.objects.create(name="Планшеты", parent=self.electronics)
+        self.assertFalse(Category.objects.filter(name="Планшеты").exists())
+
+    def test_cannot_move_into_own_subtree(self):
+        self.electronics.parent = self.android
+        with self.assertRaises(ValueError):
+            self.electronics.save()
+
+    def test_home_category_filter(self):
+        response = self.client.get(reverse("home"), {"category": self.phones.id})
+        self.assertContains(response, "Pixel 9")
+        self.assertNotContains(response, "Sony WH-1000")
+
+
+class CatalogApiTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.bulk_create([
+            Product(category=self.category, name=f"Товар {i:02d}", description="", price=100 + i % 7)
+            for i in range(45)
+        ])
+
+    def get(self, **params):
+        return self.client.get(reverse("api_products"), params)
+
+    def test_sparse_fieldset(self):
+        data = self.get(fields="id,price", limit=1).json()
+        self.assertEqual(set(data["results"][0]), {"id", "price"})
+        self.assertEqual(self.get(fields="id,secret").status_code, 400)
+
+    def test_batched_lookup_by_ids(self):
+        ids = f"{self.product2.id},{self.product1.id},999999"
+        with self.assertNumQueries(1):
+            data = self.get(ids=ids, fields="id,name").json()
+        self.assertEqual(
+            data["results"],
+            [{"id": self.product1.id, "name": "iPhone 15"}, {"id": self.product2.id, "name": "Samsung S25"}],
+        )
+
+    def test_invalid_ids_rejected(self):
+        for ids in ("1,x", "9" * 30, "²", ",".join(["1"] * 201)):
+            with self.subTest(ids=ids[:20]):
+                self.assertEqual(self.get(ids=ids).status_code, 400)
+
+    def test_filters_match_home(self):
+        data = self.get(q="iPhone", fields="name").json()
+        self.assertEqual(data["results"], [{"name": "iPhone 15"}])
+        data = self.get(min=1200, fields="name").json()
+        self.assertEqual(data["results"], [{"name": "Samsung S25"}])
+
+    def test_keyset_pagination_walks_everything_once(self):
+        for sort in ["new", "price_asc", "price_desc", "name_asc", "discount"]:
+            seen = []
+            params = {"sort": sort, "limit": 10, "fields": "id"}
+            while True:
+                data = self.get(**params).json()
+                seen += [row["id"] for row in data["results"]]
+                if not data["next"]:
+                    break
+                params["cursor"] = data["next"]
+            expected, _ = filter_products(Product.objects.all(), {"sort": sort})
+            self.assertEqual(seen, list(expected.values_list("id", flat=True)), sort)
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.get(cursor="!!!").status_code, 400)
+        cursor = encode_cursor(["abc", "x"])
+        self.assertEqual(self.get(sort="price_asc", cursor=cursor).status_code, 400)
+        self.assertEqual(self.get(sort="price_asc", cursor=encode_cursor([None, 1])).status_code, 400)
+
+    def test_etag_not_modified(self):
+        response = self.get(limit=5)
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("api_products"), {"limit": 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.product1.price = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product1.save()
+        response = self.client.get(reverse("api_products"), {"limit": 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_categories(self):
+        data = self.client.get(reverse("api_categories"), {"fields": "name,product_count"}).json()
+        self.assertEqual(data["results"], [{"name": "Смартфоны", "product_count": 47}])
+
+    def test_bench_api_command(self):
+        out = StringIO()
+        call_command("bench_api", iterations=3, target=1, stdout=out)
+        self.assertIn("достигнута", out.getvalue())
+
+
+class OrderArchiveTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        old = timezone.now() - timedelta(days=400)
+        for status in [Order.DELIVERED, Order.CANCELLED, Order.PROCESSING] * 3:
+            order = Order.objects.create(
+                user=self.user, phone="777", delivery_type="pickup", total_price=1000, status=status
+            )
+            OrderItem.objects.create(order=order, product=self.product1, quantity=1, price=1000)
+        Order.objects.update(updated_at=old, created_at=old)
+        self.fresh = Order.objects.create(
+            user=self.user, phone="777", delivery_type="pickup", status=Order.DELIVERED
+        )
+
+    def archive(self, **options):
+        call_command("archive_orders", stdout=StringIO(), **options)
+
+    def test_moves_only_old_terminal_orders(self):
+        self.archive(batch_size=2)
+
+        self.assertEqual(ArchivedOrder.objects.count(), 6)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 6)
+        self.assertEqual(Order.objects.count(), 4)
+        self.assertTrue(Order.objects.filter(pk=self.fresh.pk).exists())
+        self.assertFalse(Order.objects.filter(status=Order.DELIVERED).exclude(pk=self.fresh.pk).exists())
+
+        archived = ArchivedOrder.objects.first()
+        self.assertLess(archived.created_at, timezone.now() - timedelta(days=399))
+
+    def test_resumable_in_bounded_batches(self):
+        self.archive(batch_size=2, max_batches=1)
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.archive(batch_size=2)
+        self.assertEqual(ArchivedOrder.objects.count(), 6)
+
+    def test_already_archived_order_not_copied_twice(self):
+        order = archivable_orders().first()
+        # Копия от прерванного запуска: заказ уже в архиве, но ещё не удалён.
+        ArchivedOrder.objects.create(**{f: getattr(order, f) for f in archive.ORDER_FIELDS})
+        ArchivedOrderItem.objects.create(order_id=order.id, product=self.product1, quantity=1, price=1000)
+
+        self.archive()
+        self.assertEqual(ArchivedOrder.objects.count(), 6)
+        self.assertEqual(ArchivedOrderItem.objects.filter(order_id=order.id).count(), 1)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 6)
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+
+    def test_order_pages_read_archive(self):
+        order = archivable_orders().first()
+        self.archive()
+        self.client.login(username="testuser", password="1234")
+
+        response = self.client.get(reverse("order_detail", args=[order.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Архив")
+        self.assertContains(response, "iPhone 15")
+
+        response = self.client.get(reverse("orders"))
+        self.assertEqual(len(response.context["orders"]), 10)
+
+    def test_archived_order_visible_only_to_owner(self):
+        order = archivable_orders().first()
+        self.archive()
+        User.objects.create_user(username="other", password="1234")
+        self.client.login(username="other", password="1234")
+        response = self.client.get(reverse("order_detail", args=[order.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CustomerStatsTests(BaseTest):
+
+    def create_order(self, total, **kwargs):
+        return Order.objects.create(
+            user=self.user, phone="777", delivery_type="pickup", total_price=total, **kwargs
+        )
+
+    def test_checkout_updates_stats(self):
+        self.client.login(username="testuser", password="1234")
+        for _ in range(2):
+            self.client.post(reverse("add_to_cart", args=[self.product1.id]), {"quantity": 2})
+            self.client.post(reverse("checkout"), {"phone": "777", "delivery_type": "pickup"})
+
+        stats = CustomerStats.objects.get(user=self.user)
+        self.assertEqual(stats.order_count, 2)
+        self.assertEqual(stats.lifetime_spend, 4000)
+        self.assertEqual(stats.last_order_at, Order.objects.latest("created_at").created_at)
+
+    def test_cancellation_subtracts_spend(self):
+        self.create_order(1000)
+        order = self.create_order(1500)
+        order.transition_to(Order.PAID)
+        order.transition_to(Order.CANCELLED)
+
+        stats = CustomerStats.objects.get(user=self.user)
+        self.assertEqual(stats.order_count, 2)
+        self.assertEqual(stats.cancelled_count, 1)
+        self.assertEqual(stats.lifetime_spend, 1000)
+
+    def test_profile_reads_single_row(self):
+        self.create_order(1000)
+        self.client.login(username="testuser", password="1234")
+        self.client.get(reverse("profile"))  # прогрев сессии
+
+        # Сессия, пользователь и одна строка статистики.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("profile"))
+        self.assertEqual(response.context["stats"].lifetime_spend, 1000)
+        self.assertContains(response, "1000 ₸")
+
+    def test_reconcile_rebuilds_from_orders_and_archive(self):
+        self.create_order(1000)
+        self.create_order(500, status=Order.CANCELLED)
+        old = self.create_order(700, status=Order.DELIVERED)
+        Order.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=400))
+        call_command("archive_orders", stdout=StringIO())
+        other = User.objects.create_user(username="other", password="1234")
+        CustomerStats.objects.create(user=other, order_count=5, lifetime_spend=100)
+        CustomerStats.objects.filter(user=self.user).update(order_count=0, lifetime_spend=0)
+
+        call_command("reconcile_customer_stats", stdout=StringIO())
+
+        stats = CustomerStats.objects.get(user=self.user)
+        self.assertEqual(stats.order_count, 3)
+        self.assertEqual(stats.cancelled_count, 1)
+        self.assertEqual(stats.lifetime_spend, 1700)
+        self.assertFalse(CustomerStats.objects.filter(user=other).exists())
+
+    def test_reconcile_keeps_customers_with_only_archived_orders(self):
+        old = self.create_order(700, status=Order.DELIVERED)
+        Order.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=400))
+        call_command("archive_orders", stdout=StringIO())
+        self.assertFalse(Order.objects.exists())
+
+        call_command("reconcile_customer_stats", stdout=StringIO())
+        self.assertEqual(CustomerStats.objects.get(user=self.user).lifetime_spend, 700)
+
+
+@override_settings(COUNTER_FLUSH_SIZE=100, COUNTER_FLUSH_INTERVAL=3600)
+class PopularityTests(BaseTest):
+
+    def product_updates(self, queries):
+        return [q for q in queries if q["sql"].startswith('UPDATE "store_product"')]
+
+    def test_views_are_flushed_in_bounded_batches(self):
+        url = reverse("product_detail", args=[self.product1.id])
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(250):
+                self.client.get(url)
+        # Анонимам страница отдаётся из кэша, но просмотры всё равно считаются.
+        self.assertEqual(len(self.product_updates(ctx.captured_queries)), 2)
+
+        counters.flush()
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.view_count, 250)
+        self.assertEqual(self.product1.popularity, 250)
+
+    def test_flush_is_single_statement(self):
+        for product in (self.product1, self.product2):
+            counters.record_view(product.id)
+        counters.record_purchases({self.product2.id: 2})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(counters.flush(), 2)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product2.purchase_count, 2)
+        self.assertEqual(self.product2.popularity, 21)
+
+    def test_flush_changes_api_etag(self):
+        url = reverse("api_products")
+        etag = self.client.get(url, {"sort": "popular"})["ETag"]
+        self.assertEqual(self.client.get(url, {"sort": "popular"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        other_etag = self.client.get(url, {"sort": "price_asc"})["ETag"]
+        version = get_catalog_version()
+
+        counters.record_view(self.product1.id)
+        counters.flush()
+        response = self.client.get(url, {"sort": "popular"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["id"], self.product1.id)
+        # Остальной кэш каталога рейтинг не сбрасывает.
+        self.assertEqual(get_catalog_version(), version)
+        response = self.client.get(url, {"sort": "price_asc"}, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def decay(self, hours_ago, **options):
+        PopularityDecay.objects.create(pk=1, decayed_at=timezone.now() - timedelta(hours=hours_ago))
+        call_command("decay_popularity", stdout=StringIO(), **options)
+
+    def test_decay_changes_popularity_version_only(self):
+        Product.objects.filter(pk=self.product1.pk).update(popularity=10)
+        catalog_version, popularity_version = get_catalog_version(), get_popularity_version()
+        self.decay(hours_ago=1)
+        self.assertGreater(get_popularity_version(), popularity_version)
+        self.assertEqual(get_catalog_version(), catalog_version)
+
+    def test_first_decay_only_starts_the_clock(self):
+        Product.objects.filter(pk=self.product1.pk).update(popularity=10)
+        call_command("decay_popularity", stdout=StringIO())
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.popularity, 10)
+        self.assertTrue(PopularityDecay.objects.filter(pk=1).exists())
+
+    def test_checkout_counts_purchases(self):
+        self.client.login(username="testuser", password="1234")
+        self.client.post(reverse("add_to_cart", args=[self.product2.id]), {"quantity": 3})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("checkout"), {"phone": "777", "delivery_type": "pickup"})
+        counters.flush()
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product2.purchase_count, 3)
+
+    def test_popular_sort_and_bestseller_badge(self):
+        Product.objects.filter(pk=self.product1.pk).update(popularity=5)
+        Product.objects.filter(pk=self.product2.pk).update(popularity=50)
+
+        response = self.client.get(reverse("home"), {"sort": "popular"})
+        names = [p.name for p in response.context["page_obj"]]
+        self.assertEqual(names[:2], ["Samsung S25", "iPhone 15"])
+        self.assertContains(response, "Хит продаж", count=2)
+
+        plan = Product.objects.order_by("-popularity", "-id").explain()
+        self.assertIn("store_product_popular_idx", plan)
+
+    def test_decay_halves_popularity(self):
+        Product.objects.filter(pk=self.product1.pk).update(popularity=10)
+        Product.objects.filter(pk=self.product2.pk).update(popularity=0.005)
+        self.decay(hours_ago=24, half_life_days=1)
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertAlmostEqual(self.product1.popularity, 5, places=3)
+        self.assertEqual(self.product2.popularity, 0)
+
+    def test_decay_uses_elapsed_time(self):
+        Product.objects.filter(pk=self.product1.pk).update(popularity=8)
+        # cron пропустил запуск: прошло двое суток, а не одни.
+        self.decay(hours_ago=48, half_life_days=1)
+        self.product1.refresh_from_db()
+        self.assertAlmostEqual(self.product1.popularity, 2, places=3)
+
+
+class PromoCodeTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username="testuser", password="1234")
+        self.accessories = Category.objects.create(name="Аксессуары")
+        self.case = Product.objects.create(
+            category=self.accessories, name="Чехол", description="Test", price=200
+        )
+
+    def checkout(self, code, items):
+        for product, quantity in items:
+            self.client.post(reverse("add_to_cart", args=[product.id]), {"quantity": quantity})
+        return self.client.post(reverse("checkout"), {
+            "phone": "777", "delivery_type": "pickup", "promo_code": code
+        })
+
+    def test_percent_discount_sets_order_fields(self):
+        PromoCode.objects.create(code="sale10", value=10)
+        self.checkout(" Sale10 ", [(self.product1, 2)])
+
+        order = Order.objects.get()
+        self.assertEqual(order.promo_code, "SALE10")
+        self.assertEqual(order.discount_amount, 200)
+        self.assertEqual(order.total_price, 1800)
+        self.assertEqual(PromoCode.objects.get().used_count, 1)
+
+    def test_fixed_discount_limited_to_categories(self):
+        code = PromoCode.objects.create(code="CASE", kind=PromoCode.FIXED, value=500)
+        code.categories.add(self.accessories)
+        self.checkout("CASE", [(self.product1, 1), (self.case, 1)])
+
+        order = Order.objects.get()
+        self.assertEqual(order.discount_amount, 200)
+        self.assertEqual(order.total_price, 1000)
+
+    def test_rejected_codes_do_not_create_orders(self):
+        PromoCode.objects.create(code="BIG", value=10, min_total=5000)
+        PromoCode.objects.create(code="OLD", value=10, valid_until=timezone.now() - timedelta(days=1))
+        restricted = PromoCode.objects.create(code="CASE", value=10)
+        restricted.categories.add(self.accessories)
+
+        for code in ["BIG", "OLD", "CASE", "NOPE"]:
+            response = self.checkout(code, [(self.product1, 1)])
+            self.assertIn("promo_error", response.context, code)
+        self.assertFalse(Order.objects.exists())
+
+    def test_per_user_limit(self):
+        PromoCode.objects.create(code="ONCE", value=10, per_user_limit=1)
+        self.checkout("ONCE", [(self.product1, 1)])
+        response = self.checkout("ONCE", [(self.product1, 1)])
+
+        self.assertContains(response, "максимальное число раз")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(PromoCode.objects.get().used_count, 1)
+
+    def test_rules_cached_in_process(self):
+        PromoCode.objects.create(code="SALE10", value=10)
+        self.product1.total_price = 1000
+        promo.active_rules()
+        with self.assertNumQueries(0):
+            _, discount = promo.apply_promo("SALE10", [self.product1])
+        self.assertEqual(discount, 100)
+
+
+class PromoContentionTests(TransactionTestCase):
+
+    def test_global_limit_under_concurrent_checkouts(self):
+        code = PromoCode.objects.create(code="LIMITED", value=10, usage_limit=3)
+        users = [User.objects.create(username=f"u{i}") for i in range(10)]
+        results = []
+        barrier = threading.Barrier(len(users))
+
+        def attempt(user):
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        with transaction.atomic():
+                            promo.redeem(code, user)
+                    except OperationalError:
+                        # Тестовая SQLite в памяти не ждёт блокировку, а сразу отказывает.
+                        continue
+                    except promo.PromoError:
+                        results.append(False)
+                    else:
+                        results.append(True)
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), len(users))
+        self.assertEqual(results.count(True), 3)
+        self.assertEqual(PromoCode.objects.get().used_count, 3)
+
+
+class RepricingTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.accessories = Category.objects.create(name="Аксессуары")
+        self.case = Product.objects.create(
+            category=self.accessories, name="Чехол", description="Test", price=1234, old_price=1500
+        )
+
+    def prices(self):
+        return dict(Product.objects.values_list("name", "price"))
+
+    def test_percent_sale_with_rounding_and_exact_revert(self):
+        sale = Sale.objects.create(name="Чёрная пятница", value=10, rounding=Sale.ROUND_99)
+        self.assertEqual(apply_sale(sale), 3)
+        self.assertEqual(self.prices(), {"iPhone 15": 899, "Samsung S25": 1299, "Чехол": 1099})
+
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.old_price, 1234)
+        self.assertEqual(self.case.discount, 10)
+
+        self.assertEqual(revert_sale(sale), 3)
+        self.case.refresh_from_db()
+        self.assertEqual((self.case.price, self.case.old_price, self.case.sale), (1234, 1500, None))
+        self.assertEqual(self.prices()["iPhone 15"], 1000)
+
+    def test_sale_category_cannot_be_deleted(self):
+        sale = Sale.objects.create(name="Аксессуары", value=10, category=self.accessories)
+        with self.assertRaises(ProtectedError):
+            self.accessories.delete()
+
+        process_due_sales()
+        self.assertEqual(self.prices(), {"iPhone 15": 1000, "Samsung S25": 1500, "Чехол": 1111})
+        sale.refresh_from_db()
+        self.assertEqual(sale.category, self.accessories)
+
+    def test_fixed_sale_filtered_by_category_and_ids(self):
+        sale = Sale.objects.create(
+            name="Смартфоны", kind=Sale.FIXED, value=150, rounding=Sale.ROUND_100,
+            category=self.category, product_ids=f"{self.product2.id},{self.case.id}",
+        )
+        apply_sale(sale)
+        self.assertEqual(self.prices(), {"iPhone 15": 1000, "Samsung S25": 1300, "Чехол": 1234})
+
+    def test_cheap_products_keep_unrounded_price(self):
+        Product.objects.all().delete()
+        for price in (40, 90, 150):
+            Product.objects.create(category=self.category, name=str(price), description="", price=price)
+
+        expected = {
+            Sale.ROUND_NONE: {"40": 36, "90": 81, "150": 135},
+            Sale.ROUND_10: {"40": 36, "90": 80, "150": 130},
+            Sale.ROUND_100: {"40": 36, "90": 81, "150": 135},
+            Sale.ROUND_99: {"40": 36, "90": 81, "150": 135},
+        }
+        for rounding, prices in expected.items():
+            sale = Sale.objects.create(name=str(rounding), value=10, rounding=rounding)
+            apply_sale(sale)
+            self.assertEqual(self.prices(), prices, rounding)
+            revert_sale(sale)
+
+    def test_fixed_sale_skips_products_cheaper_than_discount(self):
+        Product.objects.create(category=self.category, name="Кабель", description="", price=40)
+        Product.objects.create(category=self.category, name="Плёнка", description="", price=100)
+        sale = Sale.objects.create(name="Минус сотня", kind=Sale.FIXED, value=100, rounding=Sale.ROUND_99)
+        apply_sale(sale)
+
+        prices = self.prices()
+        self.assertEqual((prices["Кабель"], prices["Плёнка"]), (40, 100))
+        self.assertEqual(prices["iPhone 15"], 899)
+        self.assertFalse(Product.objects.filter(name__in=["Кабель", "Плёнка"]).exclude(sale=None).exists())
+
+    def test_chunked_updates_bump_catalog_once_per_batch(self):
+        for i in range(7):
+            Product.objects.create(category=self.category, name=f"P{i}", description="", price=100)
+        sale = Sale.objects.create(name="Все", value=50)
+        version = get_catalog_version()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(apply_sale(sale, batch_size=4), 10)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "store_product"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(get_catalog_version(), version + 3)
+
+    def test_product_in_one_sale_at_a_time(self):
+        first = Sale.objects.create(name="Первая", value=10)
+        second = Sale.objects.create(name="Вторая", value=20)
+        apply_sale(first)
+        self.assertEqual(apply_sale(second), 0)
+        self.assertEqual(apply_sale(first), 0)
+
+    def test_scheduled_sale_applied_and_reverted(self):
+        now = timezone.now()
+        Sale.objects.create(
+            name="Выходные", value=50, starts_at=now + timedelta(hours=1), ends_at=now + timedelta(hours=2)
+        )
+        self.assertEqual(process_due_sales(now), (0, 0))
+        self.assertEqual(process_due_sales(now + timedelta(minutes=61)), (1, 0))
+        self.assertEqual(self.prices()["iPhone 15"], 500)
+        self.assertEqual(process_due_sales(now + timedelta(minutes=121)), (0, 1))
+        self.assertEqual(self.prices()["iPhone 15"], 1000)
+
+    def test_reprice_command(self):
+        call_command(
+            "reprice", percent=20, category=self.category.id, rounding=Sale.ROUND_10, stdout=StringIO()
+        )
+        self.assertEqual(self.prices(), {"iPhone 15": 800, "Samsung S25": 1200, "Чехол": 1234})
+
+        sale = Sale.objects.get()
+        call_command("reprice", revert=sale.id, stdout=StringIO())
+        self.assertEqual(self.prices()["iPhone 15"], 1000)
+
+    def test_admin_action_prefills_sale(self):
+        admin_user = User.objects.create_superuser(username="admin", password="1234")
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse("admin:store_product_changelist"), {
+            "action": "create_sale",
+            "_selected_action": [self.product1.id, self.product2.id],
+        })
+        self.assertEqual(
+            response["Location"],
+            reverse("admin:store_sale_add") + f"?product_ids={self.product1.id},{self.product2.id}",
+        )
+
+
+@override_settings(RATE_LIMITS={
+    "add_to_cart": "3/m",
+    "login": {"rate": "2/m", "methods": ["POST"], "field": "username"},
+})
+class RateLimitTests(BaseTest):
+
+    def add(self, client=None):
+        return (client or self.client).post(reverse("add_to_cart", args=[self.product1.id]), {"quantity": 1})
+
+    def test_cart_mutation_throttled(self):
+        for _ in range(3):
+            self.assertEqual(self.add().status_code, 302)
+        response = self.add()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertEqual(self.client.session["cart"], {str(self.product1.id): 3})
+
+    def test_users_counted_separately_anonymous_by_ip(self):
+        User.objects.create_user(username="other", password="1234")
+        first, second = Client(), Client()
+        first.login(username="testuser", password="1234")
+        second.login(username="other", password="1234")
+        for _ in range(3):
+            self.add(first)
+            self.add(second)
+        self.assertEqual(self.add(first).status_code, 429)
+        self.assertEqual(self.add(second).status_code, 429)
+
+        for _ in range(3):
+            self.add(Client())
+        self.assertEqual(self.add(Client()).status_code, 429)
+        self.assertEqual(self.add(Client(REMOTE_ADDR="10.0.0.2")).status_code, 302)
+
+    def test_login_throttled_before_password_check(self):
+        for _ in range(2):
+            self.client.post(reverse("login"), {"username": "testuser", "password": "bad"})
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse("login"), {"username": "testuser", "password": "1234"})
+        self.assertEqual(response.status_code, 429)
+
+    def test_login_page_not_throttled(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse("login")).status_code, 200)
+
+    def test_login_throttled_per_username_across_ips(self):
+        for n in range(2):
+            Client(REMOTE_ADDR=f"10.0.0.{n}").post(reverse("login"), {"username": "TestUser", "password": "bad"})
+        response = Client(REMOTE_ADDR="10.0.0.9").post(
+            reverse("login"), {"username": "testuser", "password": "bad"}
+        )
+        self.assertEqual(response.status_code, 429)
+        response = Client(REMOTE_ADDR="10.0.0.9").post(
+            reverse("login"), {"username": "other", "password": "bad"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_sliding_window(self):
+        for _ in range(10):
+            self.assertEqual(ratelimit.hit("k", 10, 60, now=0), 0)
+        self.assertGreater(ratelimit.hit("k", 10, 60, now=30), 0)
+        # Половина прошлого окна ещё учитывается: 10 * 0.5 = 5, свободно 5.
+        allowed = [ratelimit.hit("k", 10, 60, now=90) == 0 for _ in range(7)]
+        self.assertEqual(allowed, [True] * 5 + [False] * 2)
+
+    def test_decorator(self):
+        view = ratelimit.ratelimit("1/h")(lambda request: HttpResponse("ok"))
+        request = RequestFactory().get("/")
+        self.assertEqual(view(request).status_code, 200)
+        self.assertEqual(view(request).status_code, 429)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("bench_ratelimit", iterations=200, target=10000, stdout=out)
+        self.assertIn("Накладные расходы", out.getvalue())
+
+
+class HashedStorageTests(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_same_upload_stored_once(self):
+        self.product1.image = SimpleUploadedFile("a.JPG", b"same photo")
+        self.product1.save()
+        self.product2.image = SimpleUploadedFile("b.jpg", b"same photo")
+        self.product2.save()
+        self.category.image = SimpleUploadedFile("c.jpg", b"other photo")
+        self.category.save()
+
+        self.assertEqual(self.product1.image.name, self.product2.image.name)
+        self.assertRegex(self.product1.image.name, r"^hashed/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertNotEqual(self.category.image.name, self.product1.image.name)
+        files = [f for _, _, names in os.walk(self.media_root) for f in names]
+        self.assertEqual(len(files), 2)
+
+    def test_hashed_media_served_with_far_future_cache(self):
+        name = default_storage.save("products/a.jpg", ContentFile(b"photo"))
+        FileSystemStorage().save("products/legacy.jpg", ContentFile(b"photo"))
+
+        response = media(RequestFactory().get("/"), name)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+
+        response = media(RequestFactory().get("/"), "products/legacy.jpg")
+        self.assertFalse(response.has_header("Cache-Control"))
+
+    def test_dedupe_media_command(self):
+        legacy = FileSystemStorage()
+        Product.objects.filter(pk=self.product1.pk).update(
+            image=legacy.save("products/one.jpg", ContentFile(b"photo"))
+        )
+        Product.objects.filter(pk=self.product2.pk).update(
+            image=legacy.save("products/two.jpg", ContentFile(b"photo"))
+        )
+        orphan = self.old_file(default_storage.save("x.jpg", ContentFile(b"orphan")))
+
+        call_command("dedupe_media", threads=2, prune=True, stdout=StringIO())
+
+        names = set(Product.objects.values_list("image", flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(name.startswith("hashed/"))
+        self.assertTrue(default_storage.exists(name))
+        self.assertFalse(legacy.exists("products/one.jpg"))
+        self.assertFalse(default_storage.exists(orphan))
+
+    def old_file(self, name):
+        hour_ago = (timezone.now() - timedelta(hours=2)).timestamp()
+        os.utime(default_storage.path(name), (hour_ago, hour_ago))
+        return name
+
+    def test_prune_keeps_files_in_flight(self):
+        # Только что загружен, но товар с этим файлом ещё не сохранён.
+        fresh = default_storage.save("fresh.jpg", ContentFile(b"fresh"))
+        # Недописанный файл хранилища.
+        partial = fresh.replace(".jpg", ".jpg.0123.tmp")
+        with open(default_storage.path(partial), "wb") as f:
+            f.write(b"part")
+        self.old_file(partial)
+
+        call_command("dedupe_media", prune=True, stdout=StringIO())
+        self.assertTrue(default_storage.exists(fresh))
+        self.assertTrue(default_storage.exists(partial))
+
+        call_command("dedupe_media", prune=True, grace_minutes=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(fresh))
+        self.assertTrue(default_storage.exists(partial))
+
+
 class UrlSmokeTests(BaseTest):
 
     def test_all_named_urls_exist(self):
@@ -1,10 +1,12 @@
 from django.urls import path
-from store import views
+from store import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('deals/', views.deals, name='deals'),
     path('product/<int:pk>/', views.product_detail, name='product_detail'),
     path('cart/', views.cart, name='cart'),
+    path('cart/status/', views.cart_status, name='cart_status'),
     path('add-to-cart/<int:pk>/', views.add_to_cart, name='add_to_cart'),
     path('remove-from-cart/<int:pk>/', views.remove_from_cart, name='remove_from_cart'),
     path('increase/<int:pk>/', views.increase_quantity, name='increase_quantity'),
@@ -24,4 +26,6 @@ urlpatterns = [
     path('payment-info/', views.payment_info, name='payment_info'),
     path('warranty/', views.warranty, name='warranty'),
     path('help/', views.help_page, name='help'),
+    path('api/products/', api.product_list, name='api_products'),
+    path('api/categories/', api.category_list, name='api_categories'),
 ]
@@ -1,42 +1,43 @@
+import random
+import string
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db.models import F
 from django.core.paginator import Paginator
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
+from django.db import transaction
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import never_cache
+from django.middleware.csrf import get_token
+from django.views.static import serve
+
+from .archive import find_order, user_orders
+from .catalog import breadcrumbs, filter_products, subtree_products
+from .counters import count_product_view, record_purchases
+from .models import (
+    Product, Order, OrderItem, OrderStatusHistory, Category, CustomerStats, InvalidStatusTransition,
+)
+from .promo import PromoError, apply_promo, redeem
+from .storage import is_hashed
+from .tasks import send_order_confirmation, send_payment_confirmation
 
-from .models import Product, Order, OrderItem, Category
+
+def generate_tracking_code():
+    return "SP" + "".join(random.choices(string.digits, k=10))
 
 
 def home(request):
     products = Product.objects.all()
-    categories = Category.objects.all()
+    categories = Category.objects.filter(parent=None)
 
+    products, sort = filter_products(products, request.GET)
     q = request.GET.get("q")
-    if q:
-        products = products.filter(
-            Q(name__icontains=q) |
-            Q(description__icontains=q)
-        )
-
-    sort = request.GET.get("sort", "new")
-    if sort == "price_asc":
-        products = products.order_by("price")
-    elif sort == "price_desc":
-        products = products.order_by("-price")
-    elif sort == "name_asc":
-        products = products.order_by("name")
-    elif sort == "name_desc":
-        products = products.order_by("-name")
-    else:
-        products = products.order_by("-id")
-
     min_price = request.GET.get("min")
     max_price = request.GET.get("max")
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    if max_price:
-        products = products.filter(price__lte=max_price)
 
     paginator = Paginator(products, 8)
     page_obj = paginator.get_page(request.GET.get("page"))
@@ -51,6 +52,14 @@ def home(request):
     })
 
 
+def deals(request):
+    products = Product.objects.filter(discount__gt=0).order_by("-discount", "-id")
+    paginator = Paginator(products, 8)
+    page_obj = paginator.get_page(request.GET.get("page"))
+    return render(request, "store/deals.html", {"page_obj": page_obj})
+
+
+@count_product_view
 def product_detail(request, pk):
     product = get_object_or_404(Product, pk=pk)
     return render(request, "store/product_detail.html", {"product": product})
@@ -90,6 +99,13 @@ def decrease_quantity(request, pk):
     return redirect("cart")
 
 
+@never_cache
+def cart_status(request):
+    # Токен для форм страниц, которые отдаёт общий кэш (см. base.html).
+    cart = request.session.get("cart", {})
+    return JsonResponse({"count": len(cart), "csrf_token": get_token(request)})
+
+
 def cart(request):
     cart = request.session.get("cart", {})
     products = []
@@ -125,21 +141,42 @@ def checkout(request):
         products.append(product)
 
     if request.method == "POST":
-        order = Order.objects.create(
-            user=request.user,
-            phone=request.POST.get("phone"),
-            delivery_type=request.POST.get("delivery_type"),
-            address=request.POST.get("address", ""),
-            total_price=total,
-        )
-
-        for product in products:
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=product.quantity,
-                price=product.price,
-            )
+        promo_code = request.POST.get("promo_code", "").strip()
+        try:
+            promo, discount = apply_promo(promo_code, products) if promo_code else (None, 0)
+            # Заказ, позиции, история, промокод и статистика покупателя пишутся вместе.
+            with transaction.atomic():
+                if promo:
+                    redeem(promo, request.user)
+                order = Order.objects.create(
+                    user=request.user,
+                    phone=request.POST.get("phone"),
+                    delivery_type=request.POST.get("delivery_type"),
+                    address=request.POST.get("address", ""),
+                    total_price=total - discount,
+                    promo_code=promo.code if promo else "",
+                    discount_amount=discount,
+                )
+                OrderStatusHistory.objects.create(order_id=order.id, to_status=order.status, changed_by=request.user)
+
+                for product in products:
+                    OrderItem.objects.create(
+                        order=order,
+                        product=product,
+                        quantity=product.quantity,
+                        price=product.price,
+                    )
+                purchases = {product.id: product.quantity for product in products}
+                transaction.on_commit(lambda: record_purchases(purchases))
+        except PromoError as exc:
+            return render(request, "store/checkout.html", {
+                "products": products,
+                "total": total,
+                "promo_code": promo_code,
+                "promo_error": str(exc),
+            })
+
+        send_order_confirmation.delay(order_id=order.id)
 
         request.session["cart"] = {}
         return render(request, "store/success.html", {"order": order})
@@ -152,34 +189,41 @@ def checkout(request):
 
 @login_required
 def profile(request):
-    return render(request, "store/profile.html")
+    return render(request, "store/profile.html", {
+        "stats": CustomerStats.objects.filter(user=request.user).first()
+    })
 
 
 @login_required
 def orders_list(request):
-    orders = Order.objects.filter(user=request.user).order_by("-created_at")
-    return render(request, "store/order_list.html", {"orders": orders})
+    return render(request, "store/order_list.html", {"orders": user_orders(request.user)})
 
 
 def categories_list(request):
     return render(request, "store/categories.html", {
-        "categories": Category.objects.all()
+        "categories": Category.objects.filter(parent=None)
     })
 
 
 def category_detail(request, pk):
     category = get_object_or_404(Category, pk=pk)
-    products = Product.objects.filter(category=category)
+    products = subtree_products(category)
     return render(request, "store/category_detail.html", {
         "category": category,
+        "children": category.children.all(),
+        "breadcrumbs": breadcrumbs(category),
         "products": products,
     })
 
 
 @login_required
 def order_detail(request, pk):
-    order = get_object_or_404(Order, pk=pk, user=request.user)
-    items = OrderItem.objects.filter(order=order)
+    order = find_order(pk, user=request.user)
+    items = (
+        order.items.all()
+        .select_related("product")
+        .annotate(line_total=F("quantity") * F("price"))
+    )
     return render(request, "store/order_detail.html", {
         "order": order,
         "items": items
@@ -189,18 +233,25 @@ def order_detail(request, pk):
 @login_required
 def cancel_order(request, pk):
     order = get_object_or_404(Order, pk=pk, user=request.user)
-    if order.status not in ["Отменён", "Доставлен"]:
-        order.status = "Отменён"
-        order.save()
+    if request.method == "POST":
+        try:
+            order.transition_to(Order.CANCELLED, changed_by=request.user)
+        except InvalidStatusTransition:
+            pass
     return redirect("order_detail", pk=pk)
 
 
 @login_required
 def payment_page(request, pk):
     order = get_object_or_404(Order, pk=pk, user=request.user)
+    if not order.can_transition_to(Order.PAID):
+        return redirect("order_detail", pk=pk)
     if request.method == "POST":
-        order.status = "Оплачено"
-        order.save()
+        try:
+            order.transition_to(Order.PAID, changed_by=request.user)
+        except InvalidStatusTransition:
+            return redirect("order_detail", pk=pk)
+        send_payment_confirmation.delay(order_id=order.id)
         return redirect("payment_success", pk=order.id)
     return render(request, "store/payment.html", {"order": order})
 
@@ -245,3 +296,10 @@ def warranty(request):
 
 def help_page(request):
     return render(request, "store/help.html")
+
+
+def media(request, path):
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_hashed(path) and response.status_code == 200:
+        patch_cache_control(response, public=True, immutable=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response